@@ -1,10 +1,40 @@
+import multiprocessing
 import os
+import queue
+import time
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import customtkinter as ctk
-import pandas as pd
-from dian_parser import parse_dian_xml
-from threading import Thread
+from dian_parser import (DOC_TYPE_LABELS, DocumentIndex, ZipMember, find_dian_files, parse_dian_folder, source_name,
+                         source_path, zip_members)
+from document_query import MONTH_KEY, DocumentFilter, DocumentQuery, is_date, totals_layout
+from document_store import DocumentStore
+from folder_watch import FolderWatcher
+from instrumentation import Profiler, timed
+from parse_cache import open_cache
+from row_projection import COLUMNS_CONFIG, RowProjection
+from table_export import EXPORT_FILETYPES, export_projection, export_rows
+from threading import Event, Thread
+
+# Vista previa virtualizada: alto de fila del Treeview y filas extra dibujadas bajo las visibles
+PREVIEW_ROW_HEIGHT = 25
+PREVIEW_BUFFER_ROWS = 10
+
+# Carga progresiva: la interfaz vacía la cola cada LOAD_POLL_MS, hasta LOAD_TICK_SECONDS por vez
+LOAD_QUEUE_SIZE = 2000
+LOAD_POLL_MS = 200
+LOAD_TICK_SECONDS = 0.1
+
+# Modo vigilancia: cada cuánto se revisan los cambios ya estabilizados de la carpeta
+WATCH_POLL_MS = 1000
+
+# Campos con los que se calcula la llave de un documento (ver dian_parser.document_key)
+DOCUMENT_KEY_FIELDS = ('cufe', 'emisorNit', 'numero', 'documentType')
+
+# Filtros: opción "todos" del tipo de documento
+ALL_TYPES = "Todos los tipos"
+# Claves de los totales agrupados de la barra de filtros
+GROUP_TOTALS_KEYS = ['emisorNit', 'emisorNombre', MONTH_KEY]
 
 # Configuración de apariencia
 ctk.set_appearance_mode("Dark")
@@ -19,52 +49,31 @@ class SuperFacturasApp(ctk.CTk):
 
         # Variables de estado
         self.folder_path = ""
-        self.documents = []
-        self.columns_config = [
-            # Info Básica
-            ("tipoDocLabel", "Tipo Doc", True),
-            ("numero", "Número", True),
-            ("fechaEmision", "Fecha", True),
-            ("horaEmision", "Hora", False),
-            ("fechaVencimiento", "Vencimiento", False),
-            ("moneda", "Moneda", False),
-            # Emisor
-            ("emisorNombre", "Emisor Nombre", True),
-            ("emisorNit", "Emisor NIT", True),
-            ("emisorCiudad", "Emisor Ciudad", False),
-            ("emisorEmail", "Emisor Email", False),
-            # Receptor
-            ("receptorNombre", "Receptor Nombre", True),
-            ("receptorNit", "Receptor NIT", True),
-            ("receptorCiudad", "Receptor Ciudad", False),
-            ("receptorEmail", "Receptor Email", False),
-            # Pagos
-            ("metodoPago", "Método Pago", False),
-            ("canalPago", "Canal Pago", False),
-            ("fechaLimitePago", "Límite Pago", False),
-            # Totales
-            ("totalBruto", "Subtotal Bruto", True),
-            ("baseImponible", "Base Impuestos", True),
-            ("totalDescuentos", "Descuentos", False),
-            ("totalImpuestos", "Total Impuestos", True),
-            ("totalPagar", "Total a Pagar", True),
-            # Ítems (en modo detalle)
-            ("lineId", "Ítem #", True),
-            ("descripcion", "Descripción", True),
-            ("cantidad", "Cant", True),
-            ("unidadMedida", "UM", False),
-            ("precioUnitario", "Precio Unit", True),
-            ("lineaBase", "Línea Base", True),
-            ("lineaImpuestos", "Línea Imp", True),
-            ("marca", "Marca", False),
-            ("modelo", "Modelo", False),
-            ("codigoEstandar", "Cód Estándar", False),
-            # Otros
-            ("cufe", "CUFE", False),
-            ("fileName", "Archivo", False),
-        ]
+        self.store = DocumentStore()
+        self.projection = RowProjection(self.store)
+        self.query = DocumentQuery(self.store)
+        self.query_filter = None
+        self.load_errors = []
+        self.doc_index = DocumentIndex()
+        self.preview_cols = []
+        self.preview_detail = "summary"
+        self.preview_total = 0
+        self.preview_offset = 0
+        self.load_queue = None
+        self.load_cancel = None
+        self.load_total = 0
+        self.load_done = 0
+        self.load_skipped = 0
+        self.load_warnings = []
+        self.load_started = 0
+        self.load_quiet = False
+        self.doc_ids = {}
+        self.watcher = None
+        self.profiler = None
+        self.columns_config = list(COLUMNS_CONFIG)
         
         self.setup_ui()
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
 
     def setup_ui(self):
         # Grid layout 1x2
@@ -96,6 +105,23 @@ class SuperFacturasApp(ctk.CTk):
         self.check_group = ctk.CTkCheckBox(self.sidebar, text="Separar por pestañas", variable=self.group_var)
         self.check_group.pack(pady=5, padx=30, anchor="w")
 
+        # Opciones de Carga
+        self.load_options_label = ctk.CTkLabel(self.sidebar, text="OPCIONES DE CARGA", font=ctk.CTkFont(size=12, weight="bold"))
+        self.load_options_label.pack(pady=(20, 5), padx=20, anchor="w")
+
+        self.cache_var = ctk.BooleanVar(value=True)
+        self.check_cache = ctk.CTkCheckBox(self.sidebar, text="Usar caché de lectura", variable=self.cache_var)
+        self.check_cache.pack(pady=5, padx=30, anchor="w")
+
+        self.watch_var = ctk.BooleanVar(value=False)
+        self.check_watch = ctk.CTkCheckBox(self.sidebar, text="Vigilar carpeta (nuevos XML)", variable=self.watch_var,
+                                           command=self.toggle_watch)
+        self.check_watch.pack(pady=5, padx=30, anchor="w")
+
+        self.profile_var = ctk.BooleanVar(value=False)
+        self.check_profile = ctk.CTkCheckBox(self.sidebar, text="Medir tiempos (diagnóstico)", variable=self.profile_var)
+        self.check_profile.pack(pady=5, padx=30, anchor="w")
+
         # Columnas
         self.cols_label = ctk.CTkLabel(self.sidebar, text="COLUMNAS VISIBLES", font=ctk.CTkFont(size=12, weight="bold"))
         self.cols_label.pack(pady=(20, 5), padx=20, anchor="w")
@@ -111,14 +137,14 @@ class SuperFacturasApp(ctk.CTk):
             self.col_vars[key] = var
 
         # Botón Exportar
-        self.btn_export = ctk.CTkButton(self.sidebar, text="Exportar Excel", command=self.export_excel, fg_color="#10b981", hover_color="#059669")
+        self.btn_export = ctk.CTkButton(self.sidebar, text="Exportar", command=self.export_excel, fg_color="#10b981", hover_color="#059669")
         self.btn_export.pack(pady=20, padx=20, side="bottom", fill="x")
 
         # Área Principal
         self.main_frame = ctk.CTkFrame(self, corner_radius=0, fg_color="transparent")
         self.main_frame.grid(row=0, column=1, sticky="nsew", padx=20, pady=20)
         self.main_frame.grid_columnconfigure(0, weight=1)
-        self.main_frame.grid_rowconfigure(1, weight=1)
+        self.main_frame.grid_rowconfigure(2, weight=1)
 
         # Cabecera de acción
         self.header_frame = ctk.CTkFrame(self.main_frame, fg_color="transparent")
@@ -130,9 +156,50 @@ class SuperFacturasApp(ctk.CTk):
         self.path_label = ctk.CTkLabel(self.header_frame, text="Ninguna carpeta seleccionada", text_color="gray")
         self.path_label.pack(side="left", padx=20)
 
+        self.count_label = ctk.CTkLabel(self.header_frame, text="", text_color="gray")
+        self.count_label.pack(side="right", padx=20)
+
+        # Progreso de carga (solo visible mientras se leen archivos)
+        self.progress_frame = ctk.CTkFrame(self.header_frame, fg_color="transparent")
+        self.btn_cancel = ctk.CTkButton(self.progress_frame, text="Cancelar", width=90, command=self.cancel_load,
+                                        fg_color="#ef4444", hover_color="#dc2626")
+        self.btn_cancel.pack(side="right")
+        self.progress_label = ctk.CTkLabel(self.progress_frame, text="", text_color="gray")
+        self.progress_label.pack(side="right", padx=10)
+        self.progress_bar = ctk.CTkProgressBar(self.progress_frame, width=200)
+        self.progress_bar.pack(side="right")
+
+        # Filtros sobre los documentos cargados (vista previa y exportación)
+        self.filter_frame = ctk.CTkFrame(self.main_frame, fg_color="transparent")
+        self.filter_frame.grid(row=1, column=0, sticky="ew", pady=(0, 10))
+
+        self.filter_entries = {}
+        for key, placeholder, width in (("emisorNit", "Emisor NIT", 120), ("receptorNit", "Receptor NIT", 120),
+                                        ("desde", "Desde AAAA-MM-DD", 140), ("hasta", "Hasta AAAA-MM-DD", 140),
+                                        ("impuesto", "Impuesto", 90), ("tasa", "Tasa %", 70)):
+            entry = ctk.CTkEntry(self.filter_frame, placeholder_text=placeholder, width=width)
+            entry.pack(side="left", padx=(0, 5))
+            entry.bind("<Return>", lambda e: self.apply_filter())
+            self.filter_entries[key] = entry
+
+        type_labels = list(dict.fromkeys(DOC_TYPE_LABELS.values())) + ["Desconocido"]
+        self.type_var = ctk.StringVar(value=ALL_TYPES)
+        self.type_menu = ctk.CTkOptionMenu(self.filter_frame, variable=self.type_var, values=[ALL_TYPES] + type_labels,
+                                           width=140)
+        self.type_menu.pack(side="left", padx=(0, 5))
+
+        self.btn_filter = ctk.CTkButton(self.filter_frame, text="Filtrar", width=70, command=self.apply_filter)
+        self.btn_filter.pack(side="left", padx=(0, 5))
+        self.btn_clear_filter = ctk.CTkButton(self.filter_frame, text="Limpiar", width=70, command=self.clear_filter,
+                                              fg_color="gray30", hover_color="gray25")
+        self.btn_clear_filter.pack(side="left", padx=(0, 5))
+        self.btn_totals = ctk.CTkButton(self.filter_frame, text="Totales emisor/mes", width=130,
+                                        command=self.export_group_totals)
+        self.btn_totals.pack(side="left")
+
         # Tabla de Vista Previa
         self.preview_container = ctk.CTkFrame(self.main_frame, corner_radius=10)
-        self.preview_container.grid(row=1, column=0, sticky="nsew")
+        self.preview_container.grid(row=2, column=0, sticky="nsew")
         
         # Usamos Treeview de ttk para la tabla, pero la estilizamos
         style = ttk.Style()
@@ -140,7 +207,7 @@ class SuperFacturasApp(ctk.CTk):
         style.configure("Treeview", 
                         background="#1e293b", 
                         foreground="#f8fafc", 
-                        rowheight=25, 
+                        rowheight=PREVIEW_ROW_HEIGHT, 
                         fieldbackground="#1e293b",
                         borderwidth=0)
         style.map("Treeview", background=[('selected', '#4f46e5')])
@@ -155,10 +222,15 @@ class SuperFacturasApp(ctk.CTk):
         self.tree_scroll_x = ctk.CTkScrollbar(self.preview_container, orientation="horizontal")
         self.tree_scroll_x.pack(side="bottom", fill="x")
 
-        self.tree = ttk.Treeview(self.tree_frame, selectmode="browse", yscrollcommand=self.tree_scroll_y.set, xscrollcommand=self.tree_scroll_x.set)
+        # El Treeview solo contiene las filas visibles; la barra vertical recorre el total
+        self.tree = ttk.Treeview(self.tree_frame, selectmode="browse", xscrollcommand=self.tree_scroll_x.set)
         self.tree.pack(fill="both", expand=True)
+        self.tree.bind("<Configure>", lambda e: self.render_preview())
+        self.tree.bind("<MouseWheel>", self.on_preview_wheel)
+        self.tree.bind("<Button-4>", lambda e: self.scroll_preview("scroll", -3, "units"))
+        self.tree.bind("<Button-5>", lambda e: self.scroll_preview("scroll", 3, "units"))
         
-        self.tree_scroll_y.configure(command=self.tree.yview)
+        self.tree_scroll_y.configure(command=self.scroll_preview)
         self.tree_scroll_x.configure(command=self.tree.xview)
 
     def select_folder(self):
@@ -169,75 +241,310 @@ class SuperFacturasApp(ctk.CTk):
             self.load_documents(path)
 
     def load_documents(self, path):
-        self.documents = []
-        xml_files = [f for f in os.listdir(path) if f.lower().endswith('.xml')]
-        
-        if not xml_files:
-            messagebox.showwarning("Aviso", "No se encontraron archivos XML en la carpeta seleccionada.")
-            return
+        self.stop_watch()
+        self.cancel_load()
+        self.store = DocumentStore()
+        self.projection = RowProjection(self.store)
+        self.query = DocumentQuery(self.store)
+        self.load_errors = []
+        self.doc_index = DocumentIndex()
+        self.doc_ids = {}
+        self.profiler = Profiler() if self.profile_var.get() else None
+        self.update_preview()
+        # La vigilancia arranca antes del listado para no perder lo que llegue mientras tanto
+        if self.watch_var.get():
+            self.start_watch()
+        self.start_load(lambda errors: list(find_dian_files(path, errors=errors)))
+
+    def start_load(self, list_files, quiet=False):
+        # list_files(errors) devuelve las rutas a leer; quiet omite los avisos al terminar
+        # (cargas incrementales del modo vigilancia).
+        # Productor/consumidor: un hilo lista y lee los archivos y deja los resultados en una
+        # cola acotada; la interfaz la vacía por lotes, así el store solo se toca desde aquí
+        load_queue = queue.Queue(maxsize=LOAD_QUEUE_SIZE)
+        cancel = Event()
+        self.load_queue = load_queue
+        self.load_cancel = cancel
+        self.load_total = 0
+        self.load_done = 0
+        # El índice de duplicados es de toda la sesión: se cuentan los omitidos desde aquí
+        self.load_skipped = self.doc_index.skipped
+        self.load_warnings = []
+        self.load_started = time.perf_counter()
+        self.load_quiet = quiet
+
+        use_cache = self.cache_var.get()
+        index = self.doc_index
+        profiler = self.profiler
+
+        def put(message):
+            # Si la cola está llena se reintenta hasta que haya espacio o se cancele la carga
+            while not cancel.is_set():
+                try:
+                    load_queue.put(message, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
 
         def process():
-            for f in xml_files:
-                doc = parse_dian_xml(os.path.join(path, f))
+            try:
+                listing_errors = []
+                with timed(profiler, 'list'):
+                    xml_files = list_files(listing_errors)
+                if not put(("files", len(xml_files), listing_errors)) or not xml_files:
+                    return
+                cache = open_cache(lambda message: put(("warning", message))) if use_cache else None
+                results = parse_dian_folder(xml_files, cache=cache, index=index, profiler=profiler)
+                try:
+                    for result in results:
+                        if not put(("result",) + result):
+                            # Cancelada: el documento no llegó al store
+                            if result[1]:
+                                index.remove(result[1])
+                            break
+                finally:
+                    # Cerrar el generador termina el pool de procesos si se canceló
+                    results.close()
+                    if cache is not None:
+                        cache.close()
+            except Exception as e:
+                put(("error", f"{type(e).__name__}: {e}"))
+            finally:
+                put(("done",))
+                if cancel.is_set():
+                    release_pending()
+
+        def release_pending():
+            # Tras cancelar, la interfaz ya no vacía la cola: las llaves de los documentos que
+            # quedaron en ella se liberan para que el modo vigilancia no los tome por duplicados
+            while True:
+                try:
+                    message = load_queue.get_nowait()
+                except queue.Empty:
+                    return
+                if message[0] == "result" and message[2]:
+                    index.remove(message[2])
+
+        self.progress_bar.set(0)
+        self.progress_label.configure(text="Buscando archivos...")
+        self.progress_frame.pack(side="right", padx=10)
+        Thread(target=process, daemon=True).start()
+        self.after(LOAD_POLL_MS, self.poll_load, load_queue)
+
+    def poll_load(self, load_queue):
+        if load_queue is not self.load_queue:
+            return  # carga cancelada o reemplazada por otra
+
+        deadline = time.perf_counter() + LOAD_TICK_SECONDS
+        added = False
+        finished = False
+        store_started = time.perf_counter(), time.thread_time()
+        while time.perf_counter() < deadline:
+            try:
+                message = load_queue.get_nowait()
+            except queue.Empty:
+                break
+            if message[0] == "result":
+                _, file_path, doc, error = message
+                self.load_done += 1
                 if doc:
-                    self.documents.append(doc)
-            self.after(0, self.update_preview)
+                    # Un archivo que ya estaba cargado (modificado) reemplaza su versión anterior
+                    old_id = self.doc_ids.get(file_path)
+                    if old_id is not None:
+                        self.store.remove(old_id)
+                    self.doc_ids[file_path] = self.store.append(doc)
+                    added = True
+                else:
+                    self.load_errors.append((file_path, error))
+            elif message[0] == "files":
+                self.load_total = message[1]
+                self.load_errors.extend(message[2])
+                if not self.load_total:
+                    self.finish_load()
+                    if not self.load_quiet:
+                        messagebox.showwarning("Aviso", "No se encontraron archivos XML en la carpeta seleccionada.")
+                    return
+            elif message[0] == "warning":
+                self.load_warnings.append(message[1])
+            elif message[0] == "error":
+                # El productor falló (p. ej. al iniciar el pool): queda lo que ya se había cargado
+                self.finish_load()
+                messagebox.showerror("Error", f"La carga se interrumpió: {message[1]}")
+                return
+            else:
+                finished = True
+                break
+
+        if self.profiler is not None:
+            self.profiler.add_stage('store', time.perf_counter() - store_started[0], time.thread_time() - store_started[1])
+        if added:
+            with timed(self.profiler, 'preview'):
+                self.refresh_preview()
+        if finished:
+            self.finish_load()
+            if not self.load_quiet and (self.load_errors or self.load_warnings or self.doc_index.skipped):
+                self.show_load_summary()
+            if not self.load_quiet and self.profiler is not None:
+                messagebox.showinfo("Diagnóstico de carga", self.profiler.summary())
+            return
+        self.show_load_progress()
+        self.after(LOAD_POLL_MS, self.poll_load, load_queue)
+
+    def show_load_progress(self):
+        # Los duplicados omitidos también cuentan como archivos procesados
+        done = self.load_done + self.doc_index.skipped - self.load_skipped
+        if not self.load_total:
+            return
+        elapsed = time.perf_counter() - self.load_started
+        rate = done / elapsed if elapsed > 0 else 0
+        text = f"{done:,} / {self.load_total:,} archivos".replace(",", ".")
+        if rate:
+            eta = int((self.load_total - done) / rate)
+            text += f" · {rate:,.0f} arch/s · faltan {eta // 60}:{eta % 60:02d}".replace(",", ".")
+        self.progress_bar.set(done / self.load_total)
+        self.progress_label.configure(text=text)
+
+    def finish_load(self):
+        self.load_queue = None
+        self.load_cancel = None
+        self.progress_frame.pack_forget()
+        self.refresh_preview()
+
+    def cancel_load(self):
+        # Detiene el productor (y su pool) y deja en la vista lo que ya se había cargado
+        if self.load_cancel is not None:
+            self.load_cancel.set()
+            self.finish_load()
+
+    def on_close(self):
+        self.stop_watch()
+        self.cancel_load()
+        self.destroy()
+
+    def toggle_watch(self):
+        if self.watch_var.get() and self.folder_path:
+            self.start_watch()
+        else:
+            self.stop_watch()
+
+    def start_watch(self):
+        self.stop_watch()
+        self.watcher = FolderWatcher(self.folder_path).start()
+        self.after(WATCH_POLL_MS, self.poll_watch, self.watcher)
+
+    def stop_watch(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+
+    def poll_watch(self, watcher):
+        if watcher is not self.watcher:
+            return
+        # Mientras hay una carga en curso los cambios esperan en el vigilante
+        try:
+            if self.load_queue is None:
+                paths = watcher.poll()
+                if paths:
+                    self.ingest_changes(paths)
+        finally:
+            self.after(WATCH_POLL_MS, self.poll_watch, watcher)
+
+    def ingest_changes(self, paths):
+        # Solo se leen los archivos nuevos o modificados; los borrados se retiran del store.
+        # Un mismo archivo puede llegar por su evento y por el de su carpeta: conjuntos
+        files = set()
+        gone = set()
+        known = self.doc_ids
+        for path in paths:
+            if os.path.isdir(path):
+                # Carpeta nueva (o eventos perdidos): lo que aún no está cargado
+                prefix = os.path.join(path, "")
+                files.update(source for source in find_dian_files(path, errors=self.load_errors)
+                             if source not in known)
+                gone.update(source for source in known if source_path(source).startswith(prefix)
+                            and not os.path.exists(source_path(source)))
+            elif os.path.isfile(path):
+                if path.lower().endswith('.zip'):
+                    members = zip_members(path, self.load_errors)
+                    files.update(members)
+                    gone.update(source for source in known if isinstance(source, ZipMember)
+                                and source.archive == path and source not in members)
+                else:
+                    files.add(path)
+            else:
+                prefix = os.path.join(path, "")
+                gone.update(source for source in known if source_path(source) == path
+                            or source_path(source).startswith(prefix))
+
+        for source in gone:
+            doc_id = known.pop(source)
+            self.doc_index.remove(self.document_key_fields(doc_id))
+            self.store.remove(doc_id)
+        # La llave de la versión anterior se libera para que la nueva no cuente como duplicado
+        for source in files:
+            if source in known:
+                self.doc_index.remove(self.document_key_fields(known[source]))
+
+        if files:
+            self.start_load(lambda errors: sorted(files, key=str), quiet=True)
+        elif gone:
+            self.refresh_preview()
+
+    def document_key_fields(self, doc_id):
+        return {key: self.store.value(doc_id, key) for key in DOCUMENT_KEY_FIELDS}
+
+    def show_load_summary(self):
+        message = "".join(f"{warning}\n" for warning in self.load_warnings)
+        if self.doc_index.skipped:
+            message += f"Se omitieron {self.doc_index.skipped} documentos duplicados (mismo CUFE/CUDE).\n"
+        if self.load_errors:
+            detail = "\n".join(f"{source_name(p)}: {e}" for p, e in self.load_errors[:10])
+            if len(self.load_errors) > 10:
+                detail += f"\n... y {len(self.load_errors) - 10} más"
+            message += f"No se pudieron leer {len(self.load_errors)} archivos:\n{detail}"
+        messagebox.showwarning("Aviso", message.strip())
+
+    def read_filter(self):
+        # DocumentFilter con lo escrito en la barra, o None si está vacía
+        values = {key: entry.get().strip() for key, entry in self.filter_entries.items()}
+        for key in ("desde", "hasta"):
+            if values[key] and not is_date(values[key]):
+                raise ValueError(f"La fecha '{values[key]}' no es una fecha válida (AAAA-MM-DD).")
+        if self.type_var.get() != ALL_TYPES:
+            values['tipoDocLabel'] = self.type_var.get()
+        return DocumentFilter(**values) if any(values.values()) else None
+
+    def apply_filter(self):
+        try:
+            self.query_filter = self.read_filter()
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        self.update_preview()
 
-        Thread(target=process).start()
+    def clear_filter(self):
+        for entry in self.filter_entries.values():
+            entry.delete(0, "end")
+        self.type_var.set(ALL_TYPES)
+        self.query_filter = None
+        self.update_preview()
+
+    def select_filtered(self):
+        # Los índices se ponen al día con lo que haya llegado al store antes de consultar
+        if self.query_filter is None:
+            self.projection.select(None)
+        else:
+            self.projection.select(self.query.select(self.query_filter))
+
+    def visible_columns(self):
+        return [(key, label) for key, label, _ in self.columns_config if self.col_vars[key].get()]
 
     def update_preview(self, *args):
-        # Limpiar tabla
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-            
-        # Determinar todos los nombres de impuestos y campos sectoriales presentes
-        all_tax_names = set()
-        all_extra_fields = set()
-        for doc in self.documents:
-            for t_data in doc.get('impuestosDesglose', {}).values():
-                all_tax_names.add(t_data['name'])
-            for key in doc.keys():
-                if key.startswith(('Salud_', 'Transporte_')):
-                    all_extra_fields.add(key)
-            for item in doc['items']:
-                for it_t_data in item.get('lineaImpuestosDetalle', {}).values():
-                    all_tax_names.add(it_t_data['name'])
-        
-        tax_names = sorted(list(all_tax_names))
-        extra_list = sorted(list(all_extra_fields))
-            
-        # Configurar columnas visibles
-        visible_keys = [key for key, _, _ in self.columns_config if self.col_vars[key].get()]
-        visible_labels = [label for key, label, _ in self.columns_config if self.col_vars[key].get()]
-        
-        final_cols = []
-        final_labels = []
-        
-        item_keys = ['lineId', 'descripcion', 'cantidad', 'unidadMedida', 'precioUnitario', 'lineaBase', 'lineaImpuestos', 'marca', 'modelo', 'codigoEstandar']
-        is_summary = self.detail_var.get() == "summary"
-
-        for key, label in zip(visible_keys, visible_labels):
-            if is_summary and key in item_keys:
-                continue
-            final_cols.append(key)
-            final_labels.append(label)
-            
-            # Inyectar desglose de impuestos agrupados por Nombre
-            if key == 'totalImpuestos' or key == 'lineaImpuestos':
-                for t_name in tax_names:
-                    col_val = f"tax_val_{t_name}"
-                    col_rate = f"tax_rate_{t_name}"
-                    
-                    if col_val not in final_cols:
-                        final_cols.append(col_val)
-                        final_labels.append(f"{t_name} (Valor)")
-                        final_cols.append(col_rate)
-                        final_labels.append(f"{t_name} %")
-
-        # Inyectar campos sectoriales al final si existen
-        for extra in extra_list:
-            final_cols.append(extra)
-            final_labels.append(extra.replace('_', ' '))
+        # Columnas finales (con impuestos y campos sectoriales) según el modo y las columnas visibles
+        detail = self.detail_var.get()
+        self.select_filtered()
+        final_cols, final_labels = self.projection.layout(detail, self.visible_columns())
 
         self.tree["columns"] = final_cols
         self.tree["show"] = "headings"
@@ -246,130 +553,115 @@ class SuperFacturasApp(ctk.CTk):
             self.tree.heading(col, text=label)
             self.tree.column(col, width=110, anchor="center")
 
-        # Insertar datos
-        for doc in self.documents:
-            if is_summary:
-                row = []
-                for col in final_cols:
-                    if col.startswith("tax_val_"):
-                        t_name = col[8:]
-                        # Sumar todos los montos para este nombre de impuesto
-                        total_tax_val = sum(t['amount'] for t in doc.get('impuestosDesglose', {}).values() if t['name'] == t_name)
-                        row.append(total_tax_val)
-                    elif col.startswith("tax_rate_"):
-                        t_name = col[9:]
-                        # Consolidar todas las tasas aplicadas
-                        rates = sorted(list(set(t['rate'] for t in doc.get('impuestosDesglose', {}).values() if t['name'] == t_name)))
-                        row.append(", ".join(rates))
-                    elif col in doc:
-                        row.append(doc[col])
-                    else:
-                        row.append("")
-                self.tree.insert("", "end", values=row)
-            else:
-                for item in doc['items']:
-                    row = []
-                    for col in final_cols:
-                        if col.startswith("tax_val_"):
-                            t_name = col[8:]
-                            # Valor en la línea
-                            it_tax_val = sum(t['amount'] for t in item.get('lineaImpuestosDetalle', {}).values() if t['name'] == t_name)
-                            row.append(it_tax_val)
-                        elif col.startswith("tax_rate_"):
-                            t_name = col[9:]
-                            it_rates = sorted(list(set(t['rate'] for t in item.get('lineaImpuestosDetalle', {}).values() if t['name'] == t_name)))
-                            row.append(", ".join(it_rates))
-                        elif col in item:
-                            row.append(item[col])
-                        elif col in doc:
-                            row.append(doc[col])
-                        else:
-                            row.append("")
-                    self.tree.insert("", "end", values=row)
+        # Las filas salen de la proyección solo al dibujarse
+        self.preview_cols = final_cols
+        self.preview_detail = detail
+        self.preview_total = self.projection.row_count(detail)
+        self.preview_offset = 0
+        self.show_preview_count()
+        self.render_preview()
+
+    def refresh_preview(self):
+        # Tras agregar documentos: se conserva la posición y solo se rehacen las columnas si
+        # aparecieron impuestos o campos sectoriales nuevos
+        detail = self.detail_var.get()
+        self.select_filtered()
+        final_cols, _ = self.projection.layout(detail, self.visible_columns())
+        if detail != self.preview_detail or final_cols != self.preview_cols:
+            offset = self.preview_offset if detail == self.preview_detail else 0
+            self.update_preview()
+            self.preview_offset = offset
+        self.preview_total = self.projection.row_count(detail)
+        self.show_preview_count()
+        self.render_preview()
+
+    def show_preview_count(self):
+        unit = "documentos" if self.preview_detail == "summary" else "ítems"
+        text = f"{self.preview_total:,} {unit}"
+        if self.query_filter is not None:
+            text += f" (filtrado de {self.store.live_count:,} documentos)"
+        self.count_label.configure(text=text.replace(",", "."))
+
+    def preview_visible_rows(self):
+        # Filas que caben en pantalla, descontando el encabezado
+        return max(1, self.tree.winfo_height() // PREVIEW_ROW_HEIGHT - 1)
+
+    def render_preview(self):
+        # Reutiliza los ítems existentes del Treeview y solo crea o borra la diferencia
+        visible = self.preview_visible_rows()
+        self.preview_offset = max(0, min(self.preview_offset, self.preview_total - visible))
+        end = min(self.preview_offset + visible + PREVIEW_BUFFER_ROWS, self.preview_total)
+        rows = list(self.projection.rows(self.preview_detail, self.preview_cols, self.preview_offset, end))
+
+        children = self.tree.get_children()
+        for iid, values in zip(children, rows):
+            self.tree.item(iid, values=values)
+        for values in rows[len(children):]:
+            self.tree.insert("", "end", values=values)
+        if len(children) > len(rows):
+            self.tree.delete(*children[len(rows):])
+
+        if self.preview_total:
+            last = min(self.preview_offset + visible, self.preview_total)
+            self.tree_scroll_y.set(self.preview_offset / self.preview_total, last / self.preview_total)
+        else:
+            self.tree_scroll_y.set(0, 1)
+
+    def scroll_preview(self, action, amount, unit=None):
+        # Recibe los comandos de la barra vertical: ("moveto", fracción) o ("scroll", n, "units"|"pages")
+        if action == "moveto":
+            self.preview_offset = int(float(amount) * self.preview_total)
+        else:
+            step = int(float(amount))
+            if unit == "pages":
+                step *= self.preview_visible_rows()
+            self.preview_offset += step
+        self.render_preview()
+        return "break"
+
+    def on_preview_wheel(self, event):
+        steps = -int(event.delta / 120) or (-1 if event.delta > 0 else 1)
+        return self.scroll_preview("scroll", steps * 3, "units")
 
     def export_excel(self):
-        if not self.documents:
+        if not self.store.live_count:
             messagebox.showerror("Error", "No hay datos para exportar.")
             return
 
-        save_path = filedialog.asksaveasfilename(defaultextension=".xlsx", filetypes=[("Excel files", "*.xlsx")])
+        save_path = filedialog.asksaveasfilename(defaultextension=".xlsx", filetypes=EXPORT_FILETYPES)
         if not save_path:
             return
 
         try:
-            # Determinar todos los nombres de impuestos y campos sectoriales presentes
-            all_tax_names = set()
-            all_extra_fields = set()
-            for doc in self.documents:
-                for t_data in doc.get('impuestosDesglose', {}).values():
-                    all_tax_names.add(t_data['name'])
-                for key in doc.keys():
-                    if key.startswith(('Salud_', 'Transporte_')):
-                        all_extra_fields.add(key)
-                for item in doc['items']:
-                    for it_t_data in item.get('lineaImpuestosDetalle', {}).values():
-                        all_tax_names.add(it_t_data['name'])
-            
-            tax_names = sorted(list(all_tax_names))
-            extra_list = sorted(list(all_extra_fields))
-
-            rows = []
-            is_item_mode = self.detail_var.get() == "items"
-            visible_keys = [key for key, _, _ in self.columns_config if self.col_vars[key].get()]
-            column_labels = {key: label for key, label, _ in self.columns_config}
-            item_keys = ['lineId', 'descripcion', 'cantidad', 'unidadMedida', 'precioUnitario', 'lineaBase', 'lineaImpuestos', 'marca', 'modelo', 'codigoEstandar']
-
-            for doc in self.documents:
-                if is_item_mode:
-                    for item in doc['items']:
-                        row = {}
-                        for key in visible_keys:
-                            val = item.get(key, doc.get(key, ""))
-                            row[column_labels.get(key, key)] = val
-                            if key == 'totalImpuestos' or key == 'lineaImpuestos':
-                                for t_name in tax_names:
-                                    it_val = sum(t['amount'] for t in item.get('lineaImpuestosDetalle', {}).values() if t['name'] == t_name)
-                                    it_rates = sorted(list(set(t['rate'] for t in item.get('lineaImpuestosDetalle', {}).values() if t['name'] == t_name)))
-                                    row[f"{t_name} (Valor)"] = it_val
-                                    row[f"{t_name} %"] = ", ".join(it_rates)
-                        for extra in extra_list:
-                            row[extra.replace('_', ' ')] = doc.get(extra, "")
-                        rows.append(row)
-                else:
-                    row = {}
-                    for key in visible_keys:
-                        if key not in item_keys:
-                            val = doc.get(key, "")
-                            row[column_labels.get(key, key)] = val
-                            if key == 'totalImpuestos':
-                                for t_name in tax_names:
-                                    total_val = sum(t['amount'] for t in doc.get('impuestosDesglose', {}).values() if t['name'] == t_name)
-                                    rates = sorted(list(set(t['rate'] for t in doc.get('impuestosDesglose', {}).values() if t['name'] == t_name)))
-                                    row[f"{t_name} (Valor)"] = total_val
-                                    row[f"{t_name} %"] = ", ".join(rates)
-                    for extra in extra_list:
-                        row[extra.replace('_', ' ')] = doc.get(extra, "")
-                    rows.append(row)
-
-            df = pd.DataFrame(rows)
-            
-            if self.group_var.get():
-                with pd.ExcelWriter(save_path) as writer:
-                    tipo_doc_label = column_labels.get('tipoDocLabel', 'Tipo Doc')
-                    if tipo_doc_label in df.columns:
-                        for doc_type in df[tipo_doc_label].unique():
-                            type_df = df[df[tipo_doc_label] == doc_type]
-                            sheet_name = str(doc_type)[:31].replace('[', '').replace(']', '').replace('*', '').replace(':', '').replace('?', '').replace('/', '').replace('\\', '')
-                            type_df.to_excel(writer, sheet_name=sheet_name or "Hoja", index=False)
-                    else:
-                        df.to_excel(writer, sheet_name="Resultados", index=False)
-            else:
-                df.to_excel(save_path, index=False)
-
+            with timed(self.profiler, 'export'):
+                export_projection(self.projection, save_path, self.detail_var.get(), self.visible_columns(),
+                                  self.group_var.get())
             messagebox.showinfo("Éxito", "Archivo exportado correctamente.")
         except Exception as e:
             messagebox.showerror("Error", f"Error al exportar: {e}")
 
+    def export_group_totals(self):
+        # Totales por emisor y mes de los documentos filtrados (o de todos)
+        if not self.store.live_count:
+            messagebox.showerror("Error", "No hay datos para exportar.")
+            return
+        save_path = filedialog.asksaveasfilename(defaultextension=".xlsx", filetypes=EXPORT_FILETYPES,
+                                                 initialfile="totales_emisor_mes.xlsx")
+        if not save_path:
+            return
+
+        try:
+            with timed(self.profiler, 'export'):
+                doc_ids = self.query.select(self.query_filter or DocumentFilter())
+                rows = self.query.group_totals(doc_ids, GROUP_TOTALS_KEYS)
+                labels, kinds = totals_layout(GROUP_TOTALS_KEYS, {key: label for key, label, _ in COLUMNS_CONFIG})
+                export_rows(save_path, labels, kinds, rows, sheet_name="Totales")
+            messagebox.showinfo("Éxito", f"Se exportaron {len(rows)} grupos.")
+        except Exception as e:
+            messagebox.showerror("Error", f"Error al exportar: {e}")
+
 if __name__ == "__main__":
+    # Necesario para el pool de procesos del parser en el ejecutable de PyInstaller
+    multiprocessing.freeze_support()
     app = SuperFacturasApp()
     app.mainloop()
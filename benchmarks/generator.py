@@ -0,0 +1,328 @@
+import os
+import random
+
+# Generador determinista de documentos DIAN (UBL 2.1 y nómina electrónica) para pruebas de
+# carga: la misma semilla produce siempre los mismos archivos. Los montos son coherentes
+# (impuestos por línea = desglose global, totales = suma de líneas)
+
+UBL_NS = "urn:oasis:names:specification:ubl:schema:xsd"
+CAC_NS = f"{UBL_NS}:CommonAggregateComponents-2"
+CBC_NS = f"{UBL_NS}:CommonBasicComponents-2"
+EXT_NS = f"{UBL_NS}:CommonExtensionComponents-2"
+STS_NS = "dian:gov:co:facturaelectronica:Structures-2-1"
+DS_NS = "http://www.w3.org/2000/09/xmldsig#"
+NOMINA_NS = "dian:gov:co:facturaelectronica:NominaIndividual"
+
+DOCUMENT_KINDS = ('Invoice', 'CreditNote', 'DebitNote', 'NominaIndividual', 'AttachedDocument')
+
+# Proporción de cada tipo en un corpus por defecto
+DEFAULT_MIX = {'Invoice': 60, 'CreditNote': 10, 'DebitNote': 5, 'NominaIndividual': 5, 'AttachedDocument': 20}
+
+# (código, nombre, tasas posibles) en el orden en que se agregan a las líneas
+TAXES = [
+    ('01', 'IVA', ('19.00', '5.00', '0.00')),
+    ('04', 'INC', ('8.00',)),
+    ('03', 'ICA', ('0.97',)),
+    ('06', 'ReteRenta', ('2.50',)),
+]
+
+HEALTH_FIELDS = ['CODIGO_PRESTADOR', 'MODALIDAD_PAGO', 'COBERTURA_PLAN_BENEFICIOS', 'NUMERO_CONTRATO']
+TRANSPORT_CODES = ['06', '07', '08', '09']
+
+# Etiquetas que cambian según el tipo de documento
+LINE_QUANTITY = {'Invoice': 'InvoicedQuantity', 'CreditNote': 'CreditedQuantity', 'DebitNote': 'DebitedQuantity'}
+MONETARY_TOTAL = {'Invoice': 'LegalMonetaryTotal', 'CreditNote': 'LegalMonetaryTotal', 'DebitNote': 'RequestedMonetaryTotal'}
+TYPE_CODE = {'Invoice': '<cbc:InvoiceTypeCode>01</cbc:InvoiceTypeCode>',
+             'CreditNote': '<cbc:CreditNoteTypeCode>91</cbc:CreditNoteTypeCode>',
+             'DebitNote': ''}
+
+CITIES = [('11001', 'Bogotá, D.C.', 'Bogotá'), ('05001', 'Medellín', 'Antioquia'),
+          ('76001', 'Cali', 'Valle del Cauca'), ('08001', 'Barranquilla', 'Atlántico')]
+
+
+def _money(value):
+    return f"{value:.2f}"
+
+
+def _signature(rnd, size):
+    # Firma XAdES con valores base64 del tamaño pedido (repartido entre firma y certificado)
+    alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/"
+    chunk = "".join(rnd.choice(alphabet) for _ in range(64))
+    value = (chunk * (size // 128 + 1))[:size // 2]
+    return (f"<ext:UBLExtension><ext:ExtensionContent><ds:Signature Id=\"xmldsig\">"
+            f"<ds:SignedInfo><ds:SignatureMethod Algorithm=\"http://www.w3.org/2001/04/xmldsig-more#rsa-sha256\"/></ds:SignedInfo>"
+            f"<ds:SignatureValue>{value}</ds:SignatureValue>"
+            f"<ds:KeyInfo><ds:X509Data><ds:X509Certificate>{value}</ds:X509Certificate></ds:X509Data></ds:KeyInfo>"
+            f"</ds:Signature></ext:ExtensionContent></ext:UBLExtension>")
+
+
+def _extensions(rnd, signature_bytes):
+    return (f"<ext:UBLExtensions><ext:UBLExtension><ext:ExtensionContent><sts:DianExtensions>"
+            f"<sts:InvoiceSource><cbc:IdentificationCode listAgencyID=\"6\">CO</cbc:IdentificationCode></sts:InvoiceSource>"
+            f"<sts:SoftwareProvider><sts:ProviderID>900000000</sts:ProviderID><sts:SoftwareID>soft-1</sts:SoftwareID></sts:SoftwareProvider>"
+            f"<sts:QRCode>https://catalogo-vpfe.dian.gov.co/document/searchqr</sts:QRCode>"
+            f"</sts:DianExtensions></ext:ExtensionContent></ext:UBLExtension>"
+            f"{_signature(rnd, signature_bytes)}</ext:UBLExtensions>")
+
+
+def _party(tag, nit, rnd):
+    code, city, depto = rnd.choice(CITIES)
+    return (f"<cac:{tag}><cbc:AdditionalAccountID>1</cbc:AdditionalAccountID><cac:Party>"
+            f"<cac:PartyName><cbc:Name>Empresa {nit} SAS</cbc:Name></cac:PartyName>"
+            f"<cac:PhysicalLocation><cac:Address><cbc:ID>{code}</cbc:ID><cbc:CityName>{city}</cbc:CityName>"
+            f"<cbc:CountrySubentity>{depto}</cbc:CountrySubentity>"
+            f"<cac:AddressLine><cbc:Line>Calle {rnd.randint(1, 200)} # {rnd.randint(1, 99)}-{rnd.randint(1, 99)}</cbc:Line></cac:AddressLine>"
+            f"</cac:Address></cac:PhysicalLocation>"
+            f"<cac:PartyTaxScheme><cbc:RegistrationName>Empresa {nit} SAS</cbc:RegistrationName>"
+            f"<cbc:CompanyID schemeAgencyID=\"195\" schemeID=\"{nit % 10}\" schemeName=\"31\">{nit}</cbc:CompanyID>"
+            f"<cbc:TaxLevelCode listName=\"48\">O-13</cbc:TaxLevelCode>"
+            f"<cac:TaxScheme><cbc:ID>01</cbc:ID><cbc:Name>IVA</cbc:Name></cac:TaxScheme></cac:PartyTaxScheme>"
+            f"<cac:Contact><cbc:ElectronicMail>facturacion{nit}@empresa.co</cbc:ElectronicMail></cac:Contact>"
+            f"</cac:Party></cac:{tag}>")
+
+
+def _tax_total(subtotals):
+    # subtotals: [(código, nombre, tasa, base, monto)]
+    parts = "".join(
+        f"<cac:TaxSubtotal><cbc:TaxableAmount currencyID=\"COP\">{_money(base)}</cbc:TaxableAmount>"
+        f"<cbc:TaxAmount currencyID=\"COP\">{_money(amount)}</cbc:TaxAmount><cac:TaxCategory>"
+        f"<cbc:Percent>{rate}</cbc:Percent><cac:TaxScheme><cbc:ID>{code}</cbc:ID><cbc:Name>{name}</cbc:Name>"
+        f"</cac:TaxScheme></cac:TaxCategory></cac:TaxSubtotal>"
+        for code, name, rate, base, amount in subtotals)
+    total = sum(amount for *_, amount in subtotals)
+    return f"<cac:TaxTotal><cbc:TaxAmount currencyID=\"COP\">{_money(total)}</cbc:TaxAmount>{parts}</cac:TaxTotal>"
+
+
+def _references(rnd, health, transport):
+    refs = []
+    if health:
+        for field in HEALTH_FIELDS:
+            refs.append(f"<cac:AdditionalDocumentReference><cbc:ID>{field[:3]}{rnd.randint(1000, 9999)}</cbc:ID>"
+                        f"<cbc:DocumentTypeCode>050</cbc:DocumentTypeCode><cac:IssuerParty><cac:PartyIdentification>"
+                        f"<cbc:ID>{field}</cbc:ID></cac:PartyIdentification></cac:IssuerParty></cac:AdditionalDocumentReference>")
+    for code in TRANSPORT_CODES[:transport]:
+        refs.append(f"<cac:AdditionalDocumentReference><cbc:ID>T{code}-{rnd.randint(10000, 99999)}</cbc:ID>"
+                    f"<cbc:DocumentTypeCode>{code}</cbc:DocumentTypeCode></cac:AdditionalDocumentReference>")
+    return "".join(refs)
+
+
+def ubl_document(seed, root='Invoice', lines=3, taxes=1, health=False, transport=0, signature_bytes=6000):
+    # Factura, nota crédito o nota débito con `lines` líneas y hasta `taxes` impuestos por línea
+    rnd = random.Random(seed)
+    line_tag = f"{root}Line"
+    totals_by_tax = {}
+    body = []
+    subtotal = 0.0
+    for i in range(lines):
+        quantity = rnd.randint(1, 20)
+        price = rnd.randint(1000, 500000) / 100
+        base = round(quantity * price, 2)
+        subtotal += base
+        line_taxes = []
+        for code, name, rates in TAXES[:max(1, taxes)]:
+            if code != '01' and rnd.random() < 0.5:
+                continue
+            rate = rnd.choice(rates)
+            amount = round(base * float(rate) / 100, 2)
+            line_taxes.append((code, name, rate, base, amount))
+            entry = totals_by_tax.setdefault((code, name, rate), [0.0, 0.0])
+            entry[0] += base
+            entry[1] += amount
+        body.append(
+            f"<cac:{line_tag}><cbc:ID>{i + 1}</cbc:ID>"
+            f"<cbc:{LINE_QUANTITY[root]} unitCode=\"94\">{quantity}</cbc:{LINE_QUANTITY[root]}>"
+            f"<cbc:LineExtensionAmount currencyID=\"COP\">{_money(base)}</cbc:LineExtensionAmount>"
+            f"{_tax_total(line_taxes)}"
+            f"<cac:Item><cbc:Description>Producto {rnd.randint(1, 5000)} referencia {i}</cbc:Description>"
+            f"<cbc:BrandName>Marca {rnd.randint(1, 50)}</cbc:BrandName><cbc:ModelName>M{rnd.randint(1, 999)}</cbc:ModelName>"
+            f"<cac:StandardItemIdentification><cbc:ID schemeID=\"999\">{rnd.randint(10 ** 7, 10 ** 8)}</cbc:ID>"
+            f"</cac:StandardItemIdentification></cac:Item>"
+            f"<cac:Price><cbc:PriceAmount currencyID=\"COP\">{_money(price)}</cbc:PriceAmount>"
+            f"<cbc:BaseQuantity unitCode=\"94\">1</cbc:BaseQuantity></cac:Price></cac:{line_tag}>")
+
+    # Impuestos globales: un TaxTotal por tributo, con un subtotal por tasa
+    global_taxes = []
+    for code, name, _ in TAXES:
+        subtotals = [(c, n, rate, base, amount) for (c, n, rate), (base, amount) in totals_by_tax.items() if c == code]
+        if subtotals:
+            global_taxes.append(_tax_total(subtotals))
+    tax_amount = sum(amount for _, amount in totals_by_tax.values())
+
+    month = seed % 12 + 1
+    supplier = 900000000 + seed % 97
+    customer = 800000000 + seed % 89
+    number = f"SETP{990000000 + seed}"
+    reference = ""
+    if root != 'Invoice':
+        reference = (f"<cac:DiscrepancyResponse><cbc:ReferenceID>SETP{990000000 + seed - 1}</cbc:ReferenceID>"
+                     f"<cbc:ResponseCode>2</cbc:ResponseCode><cbc:Description>Ajuste</cbc:Description></cac:DiscrepancyResponse>"
+                     f"<cac:BillingReference><cac:InvoiceDocumentReference><cbc:ID>SETP{990000000 + seed - 1}</cbc:ID>"
+                     f"<cbc:UUID schemeName=\"CUFE-SHA384\">{seed - 1:096x}</cbc:UUID><cbc:IssueDate>2024-{month:02d}-01</cbc:IssueDate>"
+                     f"</cac:InvoiceDocumentReference></cac:BillingReference>")
+    total_tag = MONETARY_TOTAL[root]
+    return (
+        f"<?xml version=\"1.0\" encoding=\"UTF-8\" standalone=\"no\"?>\n"
+        f"<{root} xmlns=\"{UBL_NS}:{root}-2\" xmlns:cac=\"{CAC_NS}\" xmlns:cbc=\"{CBC_NS}\" xmlns:ext=\"{EXT_NS}\" "
+        f"xmlns:sts=\"{STS_NS}\" xmlns:ds=\"{DS_NS}\">"
+        f"{_extensions(rnd, signature_bytes)}"
+        f"<cbc:UBLVersionID>UBL 2.1</cbc:UBLVersionID><cbc:CustomizationID>10</cbc:CustomizationID>"
+        f"<cbc:ProfileID>DIAN 2.1: Factura Electrónica de Venta</cbc:ProfileID><cbc:ProfileExecutionID>1</cbc:ProfileExecutionID>"
+        f"<cbc:ID>{number}</cbc:ID><cbc:UUID schemeID=\"1\" schemeName=\"CUFE-SHA384\">{seed:096x}</cbc:UUID>"
+        f"<cbc:IssueDate>2024-{month:02d}-{seed % 28 + 1:02d}</cbc:IssueDate><cbc:IssueTime>10:{seed % 60:02d}:00-05:00</cbc:IssueTime>"
+        f"{'<cbc:DueDate>2024-%02d-28</cbc:DueDate>' % month if root == 'Invoice' else ''}"
+        f"{TYPE_CODE[root]}<cbc:Note>Documento de prueba {seed}</cbc:Note>"
+        f"<cbc:DocumentCurrencyCode>COP</cbc:DocumentCurrencyCode><cbc:LineCountNumeric>{lines}</cbc:LineCountNumeric>"
+        f"{reference}{_references(rnd, health, transport)}"
+        f"{_party('AccountingSupplierParty', supplier, rnd)}{_party('AccountingCustomerParty', customer, rnd)}"
+        f"<cac:PaymentMeans><cbc:ID>{rnd.choice('12')}</cbc:ID><cbc:PaymentMeansCode>{rnd.choice(['10', '42', '47'])}</cbc:PaymentMeansCode>"
+        f"<cbc:PaymentDueDate>2024-{month:02d}-28</cbc:PaymentDueDate></cac:PaymentMeans>"
+        f"{''.join(global_taxes)}"
+        f"<cac:{total_tag}><cbc:LineExtensionAmount currencyID=\"COP\">{_money(subtotal)}</cbc:LineExtensionAmount>"
+        f"<cbc:TaxExclusiveAmount currencyID=\"COP\">{_money(subtotal)}</cbc:TaxExclusiveAmount>"
+        f"<cbc:TaxInclusiveAmount currencyID=\"COP\">{_money(subtotal + tax_amount)}</cbc:TaxInclusiveAmount>"
+        f"<cbc:AllowanceTotalAmount currencyID=\"COP\">0.00</cbc:AllowanceTotalAmount>"
+        f"<cbc:PayableAmount currencyID=\"COP\">{_money(subtotal + tax_amount)}</cbc:PayableAmount></cac:{total_tag}>"
+        f"{''.join(body)}</{root}>")
+
+
+def nomina_document(seed, devengados=3, deducciones=2, signature_bytes=6000):
+    # Nómina individual (NominaIndividual) con `devengados` conceptos devengados y
+    # `deducciones` deducciones, además del básico, salud y pensión
+    rnd = random.Random(seed)
+    month = seed % 12 + 1
+    salary = rnd.randint(1300, 9000) * 1000
+    earned = [f"<Basico DiasTrabajados=\"30\" SueldoTrabajado=\"{_money(salary)}\"/>"]
+    earned_total = float(salary)
+    extras = [
+        ('Transporte', 'AuxilioTransporte', 162000),
+        ('Bonificaciones', None, rnd.randint(50, 500) * 1000),
+        ('Comisiones', None, rnd.randint(50, 800) * 1000),
+        ('Dotacion', None, rnd.randint(50, 200) * 1000),
+        ('Teletrabajo', None, 90000),
+    ]
+    for tag, attr, amount in extras[:devengados]:
+        if tag == 'Bonificaciones':
+            earned.append(f"<Bonificaciones><Bonificacion BonificacionS=\"{_money(amount)}\"/></Bonificaciones>")
+        elif tag == 'Comisiones':
+            earned.append(f"<Comisiones><Comision>{_money(amount)}</Comision></Comisiones>")
+        elif attr:
+            earned.append(f"<{tag} {attr}=\"{_money(amount)}\"/>")
+        else:
+            earned.append(f"<{tag}>{_money(amount)}</{tag}>")
+        earned_total += amount
+
+    health = round(salary * 0.04, 2)
+    pension = round(salary * 0.04, 2)
+    deducted = [f"<Salud Porcentaje=\"4.00\" Deduccion=\"{_money(health)}\"/>",
+                f"<FondoPension Porcentaje=\"4.00\" Deduccion=\"{_money(pension)}\"/>"]
+    deducted_total = health + pension
+    extra_deductions = [
+        ('Libranzas', rnd.randint(50, 300) * 1000),
+        ('AFC', rnd.randint(50, 300) * 1000),
+        ('Cooperativa', rnd.randint(20, 100) * 1000),
+    ]
+    for tag, amount in extra_deductions[:max(0, deducciones - 2)]:
+        if tag == 'Libranzas':
+            deducted.append(f"<Libranzas><Libranza Descripcion=\"Libranza banco\" Deduccion=\"{_money(amount)}\"/></Libranzas>")
+        else:
+            deducted.append(f"<{tag}>{_money(amount)}</{tag}>")
+        deducted_total += amount
+
+    number = f"NE{seed}"
+    employer = 900000000 + seed % 97
+    employee = 10000000 + seed % 997
+    return (
+        f"<?xml version=\"1.0\" encoding=\"UTF-8\" standalone=\"no\"?>\n"
+        f"<NominaIndividual xmlns=\"{NOMINA_NS}\" xmlns:ext=\"{EXT_NS}\" xmlns:ds=\"{DS_NS}\" "
+        f"xmlns:sts=\"{STS_NS}\" xmlns:cbc=\"{CBC_NS}\" SchemaLocation=\"\" xmlns:xsi=\"http://www.w3.org/2001/XMLSchema-instance\">"
+        f"{_extensions(rnd, signature_bytes).replace('sts:InvoiceSource', 'sts:NominaSource')}"
+        f"<Periodo FechaIngreso=\"2020-02-01\" FechaLiquidacionInicio=\"2024-{month:02d}-01\" "
+        f"FechaLiquidacionFin=\"2024-{month:02d}-28\" TiempoLaborado=\"{rnd.randint(30, 2000)}\" FechaGen=\"2024-{month:02d}-28\"/>"
+        f"<NumeroSecuenciaXML CodigoTrabajador=\"{employee}\" Prefijo=\"NE\" Consecutivo=\"{seed}\" Numero=\"{number}\"/>"
+        f"<LugarGeneracionXML Pais=\"CO\" DepartamentoEstado=\"11\" MunicipioCiudad=\"11001\" Idioma=\"es\"/>"
+        f"<ProveedorXML RazonSocial=\"Proveedor Nómina SAS\" NIT=\"900000000\" DV=\"1\" SoftwareID=\"soft-1\" SoftwareSC=\"{seed:096x}\"/>"
+        f"<CodigoQR>https://catalogo-vpfe.dian.gov.co/document/searchqr?documentkey={seed:096x}</CodigoQR>"
+        f"<InformacionGeneral Version=\"V1.0: Documento Soporte de Pago de Nómina Electrónica\" Ambiente=\"1\" TipoXML=\"102\" "
+        f"CUNE=\"{seed:096x}\" EncripCUNE=\"CUNE-SHA384\" FechaGen=\"2024-{month:02d}-28\" HoraGen=\"10:00:00-05:00\" "
+        f"PeriodoNomina=\"5\" TipoMoneda=\"COP\"/>"
+        f"<Notas>Nómina mensual</Notas>"
+        f"<Empleador RazonSocial=\"Empresa {employer} SAS\" NIT=\"{employer}\" DV=\"{employer % 10}\" Pais=\"CO\" "
+        f"DepartamentoEstado=\"11\" MunicipioCiudad=\"11001\" Direccion=\"Calle {rnd.randint(1, 200)}\"/>"
+        f"<Trabajador TipoTrabajador=\"01\" SubTipoTrabajador=\"00\" AltoRiesgoPension=\"false\" TipoDocumento=\"13\" "
+        f"NumeroDocumento=\"{employee}\" PrimerApellido=\"Pérez\" SegundoApellido=\"Gómez\" PrimerNombre=\"Ana\" "
+        f"LugarTrabajoPais=\"CO\" LugarTrabajoDepartamentoEstado=\"11\" LugarTrabajoMunicipioCiudad=\"11001\" "
+        f"LugarTrabajoDireccion=\"Calle 1\" SalarioIntegral=\"false\" TipoContrato=\"2\" Sueldo=\"{_money(salary)}\" "
+        f"CodigoTrabajador=\"{employee}\"/>"
+        f"<Pago Forma=\"1\" Metodo=\"42\" Banco=\"Banco\" TipoCuenta=\"Ahorros\" NumeroCuenta=\"{rnd.randint(10 ** 9, 10 ** 10)}\"/>"
+        f"<FechasPagos><FechaPago>2024-{month:02d}-28</FechaPago></FechasPagos>"
+        f"<Devengados>{''.join(earned)}</Devengados>"
+        f"<Deducciones>{''.join(deducted)}</Deducciones>"
+        f"<DevengadosTotal>{_money(earned_total)}</DevengadosTotal>"
+        f"<DeduccionesTotal>{_money(deducted_total)}</DeduccionesTotal>"
+        f"<ComprobanteTotal>{_money(earned_total - deducted_total)}</ComprobanteTotal>"
+        f"</NominaIndividual>")
+
+
+def attached_document(seed, inner_root='Invoice', **kwargs):
+    # Contenedor AttachedDocument con el documento en CDATA y la respuesta de validación de la DIAN
+    inner = ubl_document(seed, inner_root, **kwargs)
+    return (
+        f"<?xml version=\"1.0\" encoding=\"UTF-8\" standalone=\"no\"?>\n"
+        f"<AttachedDocument xmlns=\"{UBL_NS}:AttachedDocument-2\" xmlns:cac=\"{CAC_NS}\" xmlns:cbc=\"{CBC_NS}\" "
+        f"xmlns:ext=\"{EXT_NS}\" xmlns:ds=\"{DS_NS}\">"
+        f"{_extensions(random.Random(seed + 1), 3000)}"
+        f"<cbc:UBLVersionID>UBL 2.1</cbc:UBLVersionID><cbc:CustomizationID>Documentos adjuntos</cbc:CustomizationID>"
+        f"<cbc:ProfileID>Factura Electrónica de Venta</cbc:ProfileID><cbc:ProfileExecutionID>1</cbc:ProfileExecutionID>"
+        f"<cbc:ID>AD{seed}</cbc:ID><cbc:IssueDate>2024-{seed % 12 + 1:02d}-28</cbc:IssueDate><cbc:IssueTime>11:00:00-05:00</cbc:IssueTime>"
+        f"<cbc:DocumentType>Contenedor de Factura Electrónica</cbc:DocumentType><cbc:ParentDocumentID>SETP{990000000 + seed}</cbc:ParentDocumentID>"
+        f"<cac:SenderParty><cac:PartyTaxScheme><cbc:RegistrationName>Empresa emisora</cbc:RegistrationName>"
+        f"<cbc:CompanyID>{900000000 + seed % 97}</cbc:CompanyID></cac:PartyTaxScheme></cac:SenderParty>"
+        f"<cac:Attachment><cac:ExternalReference><cbc:MimeCode>text/xml</cbc:MimeCode><cbc:EncodingCode>UTF-8</cbc:EncodingCode>"
+        f"<cbc:Description><![CDATA[{inner}]]></cbc:Description></cac:ExternalReference></cac:Attachment>"
+        f"<cac:ParentDocumentLineReference><cbc:LineID>1</cbc:LineID><cac:DocumentReference>"
+        f"<cbc:ID>SETP{990000000 + seed}</cbc:ID><cbc:UUID schemeName=\"CUFE-SHA384\">{seed:096x}</cbc:UUID>"
+        f"<cbc:IssueDate>2024-{seed % 12 + 1:02d}-28</cbc:IssueDate><cbc:DocumentType>ApplicationResponse</cbc:DocumentType>"
+        f"<cac:Attachment><cac:ExternalReference><cbc:MimeCode>text/xml</cbc:MimeCode><cbc:Description><![CDATA["
+        f"<?xml version=\"1.0\" encoding=\"UTF-8\"?><ApplicationResponse xmlns:cbc=\"{CBC_NS}\"><cbc:ID>R{seed}</cbc:ID>"
+        f"</ApplicationResponse>]]></cbc:Description></cac:ExternalReference></cac:Attachment>"
+        f"<cac:ResultOfVerification><cbc:ValidatorID>Unidad Especial Dirección de Impuestos y Aduanas Nacionales</cbc:ValidatorID>"
+        f"<cbc:ValidationResultCode>02</cbc:ValidationResultCode><cbc:ValidationDate>2024-{seed % 12 + 1:02d}-28</cbc:ValidationDate>"
+        f"</cac:ResultOfVerification></cac:DocumentReference></cac:ParentDocumentLineReference></AttachedDocument>")
+
+
+def document(seed, kind='Invoice', lines=3, taxes=1, health=False, transport=0, signature_bytes=6000):
+    if kind == 'NominaIndividual':
+        return nomina_document(seed, signature_bytes=signature_bytes)
+    options = dict(lines=lines, taxes=taxes, health=health, transport=transport, signature_bytes=signature_bytes)
+    if kind == 'AttachedDocument':
+        return attached_document(seed, **options)
+    return ubl_document(seed, kind, **options)
+
+
+def generate_corpus(folder, count, seed=0, mix=None, lines=(1, 20), taxes=2, health=0.2, transport=0.2,
+                    signature_bytes=6000):
+    # Escribe `count` documentos en folder y devuelve sus rutas. lines es un rango (mín, máx)
+    # de líneas por documento; health y transport, la fracción de documentos con referencias
+    # del sector salud (050) y transporte (06-09)
+    mix = mix or DEFAULT_MIX
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+    rnd = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for i in range(count):
+        doc_seed = seed * 1000003 + i + 1
+        kind = rnd.choices(kinds, weights)[0]
+        content = document(
+            doc_seed, kind,
+            lines=rnd.randint(*lines),
+            taxes=taxes,
+            health=rnd.random() < health,
+            transport=rnd.randint(1, len(TRANSPORT_CODES)) if rnd.random() < transport else 0,
+            signature_bytes=signature_bytes,
+        )
+        path = os.path.join(folder, f"{kind}_{i:06d}.xml")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        paths.append(path)
+    return paths
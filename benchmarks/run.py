@@ -0,0 +1,181 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.generator import generate_corpus
+from dian_parser import parse_dian_folder
+from document_store import DocumentStore
+from row_projection import COLUMNS_CONFIG, RowProjection
+
+# Mide cada etapa (lectura, store, vista previa, filtros y exportación) sobre un corpus sintético:
+#   python -m benchmarks.run --sizes 1000 10000 100000
+# Reporta archivos/s, filas/s y la memoria pico de cada etapa. En Linux es el pico de RSS del
+# proceso durante la etapa (se reinicia antes de cada una); con --trace-memory, o donde no se
+# puede reiniciar, el pico de tracemalloc (solo objetos Python, y más lento)
+
+DEFAULT_SIZES = [1000, 10000]
+PREVIEW_ROWS = 40
+
+
+def reset_peak_rss():
+    # Escribir 5 en clear_refs reinicia VmHWM (Linux 4.0+); False si no se puede
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def rss_mb(field):
+    # VmRSS (actual) o VmHWM (pico) de /proc/self/status
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) / 1024
+    return None
+
+
+def run_stage(name, fn, files, trace_memory=False):
+    # fn() devuelve el número de filas producidas por la etapa
+    trace_memory = trace_memory or not reset_peak_rss()
+    if trace_memory:
+        tracemalloc.start()
+        start = 0.0
+    else:
+        start = rss_mb('VmRSS')
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    rows = fn()
+    wall = time.perf_counter() - wall
+    cpu = time.process_time() - cpu
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+    else:
+        peak = rss_mb('VmHWM')
+    return {
+        'stage': name,
+        'files': files,
+        'rows': rows,
+        'seconds': wall,
+        'cpu_seconds': cpu,
+        'files_per_sec': files / wall if wall else 0,
+        'rows_per_sec': rows / wall if wall else 0,
+        'peak_mb': peak,
+        # Lo que la etapa sumó por encima de la memoria con que empezó
+        'peak_growth_mb': peak - start,
+    }
+
+
+def corpus(size, args):
+    folder = os.path.join(args.data, f"{size}-seed{args.seed}-sig{args.signature_bytes}")
+    if os.path.isdir(folder) and len(os.listdir(folder)) == size:
+        return sorted(os.path.join(folder, name) for name in os.listdir(folder))
+    shutil.rmtree(folder, ignore_errors=True)
+    return generate_corpus(folder, size, seed=args.seed, lines=(args.min_lines, args.max_lines), taxes=args.taxes,
+                           health=args.health, transport=args.transport, signature_bytes=args.signature_bytes)
+
+
+def bench_size(size, args, out_dir):
+    from table_export import export_projection
+
+    files = corpus(size, args)
+    visible = [(key, label) for key, label, enabled in COLUMNS_CONFIG if enabled]
+    docs = []
+    store = DocumentStore()
+    projection = RowProjection(store)
+    results = []
+
+    def parse():
+        docs.extend(doc for _, doc, _ in parse_dian_folder(files, workers=args.workers) if doc)
+        return sum(len(doc['items']) for doc in docs)
+
+    def load_store():
+        store.extend(docs)
+        docs.clear()
+        return store.line_count
+
+    def preview():
+        # Lo que hace update_preview: columnas finales y la primera ventana de filas
+        rows = 0
+        for detail in ("summary", "items"):
+            cols, _ = projection.layout(detail, visible)
+            rows += len(list(projection.rows(detail, cols, 0, PREVIEW_ROWS)))
+        return rows
+
+    def query():
+        # Índices más filtros típicos (un emisor, un trimestre, un impuesto) y totales por emisor y mes
+        from document_query import MONTH_KEY, DocumentFilter, DocumentQuery
+        q = DocumentQuery(store)
+        nit = store.value(0, 'emisorNit')
+        rows = len(q.select(DocumentFilter(emisorNit=nit)))
+        rows += len(q.select(DocumentFilter(desde='2024-01-01', hasta='2024-03-31')))
+        rows += len(q.select(DocumentFilter(impuesto='IVA', tasa='19.00')))
+        return rows + len(q.group_totals(q.select(DocumentFilter()), ['emisorNit', MONTH_KEY]))
+
+    def export(fmt):
+        return lambda: export_projection(projection, os.path.join(out_dir, f"bench_{size}.{fmt}"),
+                                         args.detail, visible, args.group)
+
+    stages = [('parse', parse), ('store', load_store), ('preview', preview), ('query', query)]
+    stages += [(f"export_{fmt}", export(fmt)) for fmt in args.formats]
+    for name, fn in stages:
+        try:
+            results.append(run_stage(name, fn, size, args.trace_memory))
+        except RuntimeError as e:
+            # p. ej. Parquet sin pyarrow
+            print(f"  {name}: omitido ({e})", file=sys.stderr)
+    return results
+
+
+def print_table(size, results):
+    print(f"\n{size:,} documentos".replace(",", "."))
+    print(f"{'etapa':<14}{'seg':>9}{'cpu':>9}{'arch/s':>11}{'filas/s':>12}{'pico MB':>10}{'+MB':>8}")
+    for r in results:
+        print(f"{r['stage']:<14}{r['seconds']:>9.2f}{r['cpu_seconds']:>9.2f}"
+              f"{r['files_per_sec']:>11,.0f}{r['rows_per_sec']:>12,.0f}{r['peak_mb']:>10.1f}{r['peak_growth_mb']:>8.1f}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark de lectura, vista previa y exportación")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min-lines", type=int, default=1)
+    parser.add_argument("--max-lines", type=int, default=20)
+    parser.add_argument("--taxes", type=int, default=2, help="Impuestos posibles por línea (1-4)")
+    parser.add_argument("--health", type=float, default=0.2, help="Fracción con referencias del sector salud (050)")
+    parser.add_argument("--transport", type=float, default=0.2, help="Fracción con referencias de transporte (06-09)")
+    parser.add_argument("--signature-bytes", type=int, default=6000, help="Tamaño del bloque de firma")
+    parser.add_argument("--workers", type=int, help="Procesos de lectura (por defecto, uno por CPU)")
+    parser.add_argument("--detail", choices=("summary", "items"), default="items")
+    parser.add_argument("--group", action="store_true", help="Exportar separando por tipo de documento")
+    parser.add_argument("--formats", nargs="+", default=["xlsx", "csv"], choices=("xlsx", "csv", "parquet"))
+    parser.add_argument("--data", default=os.path.join(tempfile.gettempdir(), "superfacturas-bench"),
+                        help="Carpeta donde se generan (y reutilizan) los corpus")
+    parser.add_argument("--trace-memory", action="store_true", help="Medir la memoria con tracemalloc en vez del RSS")
+    parser.add_argument("--json", help="Guardar los resultados en este archivo")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    report = {'sizes': {}, 'args': vars(args)}
+    with tempfile.TemporaryDirectory() as out_dir:
+        for size in args.sizes:
+            results = bench_size(size, args, out_dir)
+            report['sizes'][size] = results
+            print_table(size, results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
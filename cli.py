@@ -0,0 +1,246 @@
+import argparse
+import json
+import os
+import sys
+
+from dian_parser import READ_AHEAD_THREADS, DocumentIndex, find_dian_files, parse_dian_folder, source_name
+from document_store import DOC_TEXT_FIELDS, DocumentStore
+from instrumentation import Profiler, timed
+from parse_cache import open_cache
+from reconciliation import RECONCILIATION_KEYS
+from row_projection import COLUMNS_CONFIG, RowProjection
+
+# Modo por lotes sin interfaz: carpeta -> hoja de cálculo, pensado para tareas programadas.
+# tkinter/customtkinter y los escritores de exportación se importan solo cuando se usan.
+# Códigos de salida: 0 todo leído, 1 hubo archivos con error, 2 uso incorrecto o sin archivos,
+# 3 falló la exportación
+
+EXIT_OK = 0
+EXIT_FILE_ERRORS = 1
+EXIT_USAGE = 2
+EXIT_EXPORT_ERROR = 3
+
+FORMATS = ('xlsx', 'csv', 'parquet')
+
+
+def non_negative_int(value):
+    # Tipo de argparse: un entero >= 0 (un error aquí sale con EXIT_USAGE)
+    try:
+        number = int(value)
+    except ValueError:
+        number = -1
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"debe ser un entero mayor o igual a 0: {value!r}")
+    return number
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="superfacturas",
+        description="Convierte una carpeta de XML DIAN en una hoja de cálculo (xlsx, csv o parquet).")
+    parser.add_argument("folder", nargs="?", help="Carpeta con XML o .zip (se recorre recursivamente)")
+    parser.add_argument("-o", "--output", help="Archivo de salida (por defecto facturas.<formato>)")
+    parser.add_argument("-f", "--format", choices=FORMATS,
+                        help="Formato de salida; si se omite, sale de la extensión de --output (xlsx por defecto)")
+    parser.add_argument("-d", "--detail", choices=("summary", "items"), default="summary",
+                        help="summary: una fila por documento; items: una fila por ítem")
+    parser.add_argument("-c", "--columns",
+                        help="Claves de columna separadas por coma, o 'all' (por defecto las visibles de la app)")
+    parser.add_argument("-g", "--group", action="store_true",
+                        help="Separar por tipo de documento (pestañas en xlsx, un archivo por tipo en csv)")
+    parser.add_argument("-r", "--reconcile", action="store_true",
+                        help="Agregar las columnas de conciliación de totales e informar los descuadres")
+    filters = parser.add_argument_group("filtros", "Exportar solo los documentos que cumplan todos los criterios")
+    filters.add_argument("--emisor", action="append", help="NIT del emisor (se puede repetir)")
+    filters.add_argument("--receptor", action="append", help="NIT del receptor (se puede repetir)")
+    filters.add_argument("--tipo", action="append", help="Tipo de documento, p. ej. 'Factura' (se puede repetir)")
+    filters.add_argument("--desde", help="Fecha de emisión inicial, AAAA-MM-DD")
+    filters.add_argument("--hasta", help="Fecha de emisión final, AAAA-MM-DD")
+    filters.add_argument("--impuesto", help="Documentos con este impuesto (p. ej. IVA)")
+    filters.add_argument("--tasa", help="Documentos con un impuesto a esta tasa (p. ej. 19 o 19.00)")
+    filters.add_argument("--totales-por", metavar="CLAVES",
+                         help="Exportar totales agrupados en vez de filas, p. ej. emisorNit,mes")
+    parser.add_argument("-w", "--workers", type=int, help="Procesos de lectura (por defecto, uno por CPU)")
+    parser.add_argument("--read-threads", type=non_negative_int, default=READ_AHEAD_THREADS,
+                        help="Hilos que leen los archivos por adelantado (0: cada proceso lee los suyos)")
+    parser.add_argument("--no-cache", action="store_true", help="No usar la caché de lectura")
+    parser.add_argument("--no-recursive", action="store_true", help="No entrar en subcarpetas")
+    parser.add_argument("--profile", action="store_true",
+                        help="Medir tiempos por etapa y por archivo y mostrar los más lentos y los fallidos")
+    parser.add_argument("--profile-json", help="Guardar el detalle de tiempos por archivo en este JSON")
+    parser.add_argument("--list-columns", action="store_true", help="Mostrar las claves de columna y salir")
+    parser.add_argument("--gui", action="store_true", help="Abrir la aplicación de escritorio")
+    return parser
+
+
+def output_path(args):
+    fmt = args.format
+    path = args.output
+    if path is None:
+        return f"facturas.{fmt or 'xlsx'}"
+    if fmt and os.path.splitext(path)[1].lower() != f".{fmt}":
+        path += f".{fmt}"
+    return path
+
+
+def select_columns(spec):
+    if not spec:
+        return [(key, label) for key, label, enabled in COLUMNS_CONFIG if enabled]
+    if spec.strip().lower() == "all":
+        return [(key, label) for key, label, _ in COLUMNS_CONFIG]
+    labels = {key: label for key, label, _ in COLUMNS_CONFIG}
+    keys = [key.strip() for key in spec.split(",") if key.strip()]
+    unknown = [key for key in keys if key not in labels]
+    if unknown:
+        raise ValueError(f"Columnas desconocidas: {', '.join(unknown)} (ver --list-columns)")
+    # Se respeta el orden de la configuración, igual que en la vista previa
+    return [(key, label) for key, label, _ in COLUMNS_CONFIG if key in keys]
+
+
+def build_filter(args):
+    # DocumentFilter con las opciones de filtro, o None si no se usó ninguna
+    from document_query import DocumentFilter, is_date
+
+    values = {
+        'emisorNit': args.emisor, 'receptorNit': args.receptor, 'tipoDocLabel': args.tipo,
+        'desde': args.desde, 'hasta': args.hasta, 'impuesto': args.impuesto, 'tasa': args.tasa,
+    }
+    for key in ('desde', 'hasta'):
+        if values[key] and not is_date(values[key]):
+            raise ValueError(f"--{key} debe ser una fecha válida (AAAA-MM-DD)")
+    if not any(values.values()):
+        return None
+    return DocumentFilter(**values)
+
+
+def group_keys(spec):
+    from document_query import MONTH_KEY
+    keys = [key.strip() for key in spec.split(",") if key.strip()]
+    unknown = [key for key in keys if key != MONTH_KEY and key not in DOC_TEXT_FIELDS]
+    if not keys or unknown:
+        raise ValueError(f"Claves de agrupación inválidas: {', '.join(unknown) or spec!r} "
+                         f"(campos de cabecera o '{MONTH_KEY}')")
+    return keys
+
+
+def load_store(folder, recursive=True, workers=None, use_cache=True, profiler=None,
+               read_threads=READ_AHEAD_THREADS):
+    store = DocumentStore()
+    index = DocumentIndex()
+    errors = []
+    with timed(profiler, 'list'):
+        files = list(find_dian_files(folder, recursive=recursive, errors=errors))
+    if not files:
+        return store, index, errors, 0
+
+    cache = open_cache(lambda message: print(message, file=sys.stderr)) if use_cache else None
+    batch = []
+    try:
+        for file_path, doc, error in parse_dian_folder(files, workers=workers, cache=cache, index=index,
+                                                       profiler=profiler, read_threads=read_threads):
+            if doc:
+                batch.append(doc)
+                if len(batch) >= 500:
+                    with timed(profiler, 'store'):
+                        store.extend(batch)
+                    batch = []
+            elif error:
+                errors.append((file_path, error))
+        with timed(profiler, 'store'):
+            store.extend(batch)
+    finally:
+        if cache is not None:
+            cache.close()
+    return store, index, errors, len(files)
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.gui:
+        from app import SuperFacturasApp
+        SuperFacturasApp().mainloop()
+        return EXIT_OK
+
+    if args.list_columns:
+        for key, label, enabled in COLUMNS_CONFIG:
+            print(f"{key:<20} {label}{' *' if enabled else ''}")
+        return EXIT_OK
+
+    if not args.folder:
+        parser.error("falta la carpeta (o use --gui)")
+    if not os.path.isdir(args.folder):
+        print(f"No existe la carpeta: {args.folder}", file=sys.stderr)
+        return EXIT_USAGE
+    try:
+        visible = select_columns(args.columns)
+        flt = build_filter(args)
+        keys = group_keys(args.totales_por) if args.totales_por else None
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return EXIT_USAGE
+    if args.reconcile:
+        shown = {key for key, _ in visible} | RECONCILIATION_KEYS
+        visible = [(key, label) for key, label, _ in COLUMNS_CONFIG if key in shown]
+
+    profiler = Profiler() if args.profile or args.profile_json else None
+    store, index, errors, total = load_store(
+        args.folder, recursive=not args.no_recursive, workers=args.workers, use_cache=not args.no_cache,
+        profiler=profiler, read_threads=args.read_threads)
+    if not total:
+        print("No se encontraron archivos XML en la carpeta.", file=sys.stderr)
+        return EXIT_USAGE
+
+    from table_export import export_projection, export_rows
+
+    path = output_path(args)
+    try:
+        with timed(profiler, 'export'):
+            projection = RowProjection(store)
+            doc_ids = None
+            if flt is not None or keys:
+                from document_query import DocumentFilter, DocumentQuery, totals_layout
+                query = DocumentQuery(store)
+                doc_ids = query.select(flt or DocumentFilter())
+                projection.select(doc_ids)
+            if keys:
+                totals = query.group_totals(doc_ids, keys)
+                labels, kinds = totals_layout(keys, {key: label for key, label, _ in COLUMNS_CONFIG})
+                export_rows(path, labels, kinds, totals, sheet_name="Totales")
+                rows = len(totals)
+            else:
+                rows = export_projection(projection, path, args.detail, visible, args.group)
+    except Exception as e:
+        print(f"Error al exportar: {e}", file=sys.stderr)
+        return EXIT_EXPORT_ERROR
+
+    if args.reconcile:
+        from reconciliation import mismatches
+        with timed(profiler, 'reconcile'):
+            # Solo los documentos exportados (los que dejan pasar los filtros)
+            mismatched = len(mismatches(store, doc_ids))
+    if args.profile:
+        print(profiler.summary(), file=sys.stderr)
+    if args.profile_json:
+        with open(args.profile_json, 'w', encoding='utf-8') as f:
+            json.dump(profiler.to_dict(), f, indent=2)
+
+    selected = f" ({len(doc_ids)} según los filtros)" if flt is not None else ""
+    print(f"{len(store)} documentos{selected}, {rows} filas -> {path}", file=sys.stderr)
+    if args.reconcile:
+        print(f"{mismatched} documentos con descuadre en sus totales.", file=sys.stderr)
+    if index.skipped:
+        print(f"Se omitieron {index.skipped} documentos duplicados (mismo CUFE/CUDE).", file=sys.stderr)
+    for file_path, error in errors:
+        print(f"ERROR {source_name(file_path)}: {error}", file=sys.stderr)
+    if errors:
+        print(f"No se pudieron leer {len(errors)} archivos.", file=sys.stderr)
+        return EXIT_FILE_ERRORS
+    return EXIT_OK
+
+
+if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()
+    sys.exit(main())
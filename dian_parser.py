@@ -1,6 +1,163 @@
+import itertools
+import multiprocessing
 import os
+import re
+import threading
+import time
+import zipfile
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from lxml import etree
 
+# Se incrementa cada vez que cambia el diccionario que produce parse_dian_xml,
+# para invalidar los resultados guardados en la caché de lectura
+PARSER_VERSION = 4
+
+# Lectura anticipada (read_ahead): hilos de E/S, archivos leídos por delante del parser por
+# cada hilo y tope de bytes ya leídos que esperan turno. En carpetas de red (SMB/NFS) la
+# latencia de cada lectura se solapa con el parseo en lugar de sumarse
+READ_AHEAD_THREADS = 8
+READ_AHEAD_FILES = 4
+READ_AHEAD_BYTES = 64 * 1024 * 1024
+
+# Bloques de tareas por proceso que pueden estar repartidos sin que se haya pedido su resultado
+IN_FLIGHT_CHUNKS = 2
+
+# Namespaces
+NS = {
+    'cac': "urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2",
+    'cbc': "urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2",
+    'ext': "urn:oasis:names:specification:ubl:schema:xsd:CommonExtensionComponents-2",
+    'sts': "dian:gov:co:facturaelectronica:Structures-2-1"
+}
+
+CAC = "{%s}" % NS['cac']
+CBC = "{%s}" % NS['cbc']
+
+DOC_TYPE_LABELS = {
+    'Invoice': "Factura",
+    'CreditNote': "Nota Crédito",
+    'DebitNote': "Nota Débito",
+    'NominaElectronica': "Nómina",
+    'NominaIndividual': "Nómina",
+    'NominaIndividualDeAjuste': "Nómina de Ajuste",
+}
+
+TRANSPORT_LABELS = {'06': 'Manifiesto', '07': 'Remesa', '08': 'DTA', '09': 'OTM'}
+
+# Campos de cabecera: hijos directos de la raíz en UBL 2.1
+HEADER_FIELDS = [
+    ('ublVersion', 'UBLVersionID'),
+    ('customizationID', 'CustomizationID'),
+    ('profileID', 'ProfileID'),
+    ('profileExecutionID', 'ProfileExecutionID'),
+    ('numero', 'ID'),
+    ('cufe', 'UUID'),
+    ('fechaEmision', 'IssueDate'),
+    ('horaEmision', 'IssueTime'),
+    ('fechaVencimiento', 'DueDate'),
+    ('tipoFactura', 'InvoiceTypeCode'),
+    ('moneda', 'DocumentCurrencyCode'),
+    ('notas', 'Note'),
+    ('lineasCount', 'LineCountNumeric'),
+]
+
+TOTAL_FIELDS = [
+    ('totalBruto', 'LineExtensionAmount'),
+    ('baseImponible', 'TaxExclusiveAmount'),
+    ('totalIvaInc', 'TaxInclusiveAmount'),
+    ('totalDescuentos', 'AllowanceTotalAmount'),
+    ('totalCargos', 'ChargeTotalAmount'),
+    ('totalAnticipos', 'PrepaidAmount'),
+    ('totalPagar', 'PayableAmount'),
+]
+
+# Por tipo UBL: etiquetas de la cantidad en las líneas y del nodo de totales. Las de
+# factura quedan como alternativa para emisores que las usan en las notas
+UBL_LINE_QUANTITY = {
+    'Invoice': ('InvoicedQuantity',),
+    'CreditNote': ('CreditedQuantity', 'InvoicedQuantity'),
+    'DebitNote': ('DebitedQuantity', 'InvoicedQuantity'),
+}
+UBL_TOTALS = {
+    'DebitNote': ('RequestedMonetaryTotal', 'LegalMonetaryTotal'),
+    'NominaElectronica': ('RequestedMonetaryTotal',),
+}
+
+# Nómina individual (esquema propio de la DIAN, sin cac/cbc): los conceptos de Devengados
+# y Deducciones traen el valor como texto o en estos atributos
+NOMINA_ROOTS = ('NominaIndividual', 'NominaIndividualDeAjuste')
+NOMINA_AMOUNT_ATTRS = (
+    'SueldoTrabajado', 'AuxilioTransporte', 'ViaticoManutAlojS', 'ViaticoManutAlojNS', 'Pago', 'PagoNS',
+    'PagoIntereses', 'BonificacionS', 'BonificacionNS', 'AuxilioS', 'AuxilioNS', 'ConceptoS', 'ConceptoNS',
+    'CompensacionO', 'CompensacionE', 'PagoS', 'PagoAlimentacionS', 'PagoAlimentacionNS', 'Deduccion',
+    'DeduccionSP', 'DeduccionSub', 'SancionPublic', 'SancionPriv',
+)
+NOMINA_QUANTITY_ATTRS = ('DiasTrabajados', 'Cantidad', 'Porcentaje')
+NOMINA_DESCRIPTION_ATTRS = ('DescripcionConcepto', 'Descripcion')
+
+
+# Apertura de ext:UBLExtensions (firma XAdES, certificados, QR) con cualquier prefijo
+EXTENSIONS_OPEN = re.compile(rb'<([A-Za-z_][\w.\-]*:)?UBLExtensions[\s/>]')
+
+
+def _xp(path):
+    return etree.XPath(path, namespaces=NS)
+
+
+# XPaths precompilados, siempre relativos a un nodo ancla
+X_PARTY = _xp("cac:Party")
+X_PARTY_NIT = _xp(".//cbc:CompanyID")
+X_PARTY_ID = _xp(".//cbc:ID")
+X_PARTY_NAME = _xp(".//cac:PartyName/cbc:Name")
+X_PARTY_REG_NAME = _xp(".//cbc:RegistrationName")
+X_PARTY_REGIMEN = _xp(".//cbc:TaxLevelCode")
+X_PARTY_CITY = _xp(".//cbc:CityName")
+X_PARTY_DEPTO = _xp(".//cbc:CountrySubentity")
+X_PARTY_ADDRESS = _xp(".//cac:AddressLine/cbc:Line")
+X_PARTY_EMAIL = _xp(".//cbc:ElectronicMail")
+X_PARTY_FIRST_NAME = _xp(".//cbc:FirstName")
+X_PARTY_FAMILY_NAME = _xp(".//cbc:FamilyName")
+
+X_PAYMENT_CODE = _xp("cbc:PaymentMeansCode")
+X_PAYMENT_ID = _xp("cbc:ID")
+X_PAYMENT_DUE = _xp("cbc:PaymentDueDate")
+
+X_TOTALS = {key: _xp(f"cbc:{tag}") for key, tag in TOTAL_FIELDS}
+
+X_TAX_SUBTOTAL = _xp("cac:TaxSubtotal")
+X_TAX_ID = _xp("cac:TaxCategory/cac:TaxScheme/cbc:ID")
+X_TAX_NAME = _xp("cac:TaxCategory/cac:TaxScheme/cbc:Name")
+X_TAX_PERCENT = _xp("cac:TaxCategory/cbc:Percent")
+X_TAX_AMOUNT = _xp("cbc:TaxAmount")
+
+X_REF_TYPE = _xp("cbc:DocumentTypeCode")
+X_REF_ID = _xp("cbc:ID")
+X_REF_ISSUER_ID = _xp("cac:IssuerParty/cac:PartyIdentification/cbc:ID")
+
+X_LINE_TAX_TOTAL = _xp("cac:TaxTotal")
+X_LINE_ID = _xp("cbc:ID")
+X_LINE_DESCRIPTION = _xp("cac:Item/cbc:Description")
+X_LINE_QUANTITY = {tag: _xp("|".join(f"cbc:{q}" for q in quantities)) for tag, quantities in UBL_LINE_QUANTITY.items()}
+X_LINE_UNIT = {tag: _xp("|".join(f"cbc:{q}/@unitCode" for q in quantities)) for tag, quantities in UBL_LINE_QUANTITY.items()}
+X_LINE_PRICE = _xp("cac:Price/cbc:PriceAmount")
+X_LINE_BASE = _xp("cbc:LineExtensionAmount")
+X_LINE_STANDARD_CODE = _xp("cac:Item/cac:StandardItemIdentification/cbc:ID")
+X_LINE_BRAND = _xp("cac:Item/cbc:BrandName")
+X_LINE_MODEL = _xp("cac:Item/cbc:ModelName")
+
+# Contenedor AttachedDocument: el documento real viaja como CDATA en la descripción
+X_ATTACHED_CONTENT = _xp("cac:Attachment/cac:ExternalReference/cbc:Description")
+X_ATTACHED_ID = _xp("cbc:ID")
+X_ATTACHED_DATE = _xp("cbc:IssueDate")
+X_ATTACHED_PARENT_REF = _xp("cac:ParentDocumentLineReference/cac:DocumentReference")
+X_ATTACHED_PARENT_UUID = _xp("cbc:UUID")
+X_ATTACHED_RESULT = _xp("cac:ResultOfVerification/cbc:ValidationResultCode")
+X_ATTACHED_RESULT_DATE = _xp("cac:ResultOfVerification/cbc:ValidationDate")
+
+XML_DECLARATION = re.compile(r'^\s*<\?xml[^>]*\?>')
+
+
 def get_tag_value(element, xpath, namespaces):
     try:
         nodes = element.xpath(xpath, namespaces=namespaces)
@@ -10,167 +167,799 @@ def get_tag_value(element, xpath, namespaces):
     except:
         return ""
 
-def parse_dian_xml(file_path):
+
+def _value(xpath, nodes):
+    # Equivale a get_tag_value sobre la unión de los nodos ancla, en orden de documento
+    for node in nodes:
+        found = xpath(node)
+        if found:
+            first = found[0]
+            return first if isinstance(first, str) else first.text
+    return ""
+
+
+def _collect_anchors(root, tag_name, doc_type):
+    # Un único recorrido del árbol ubica todos los nodos ancla del documento
+    if doc_type != "Nómina":
+        emisor_tag, receptor_tag = 'AccountingSupplierParty', 'AccountingCustomerParty'
+    else:
+        emisor_tag, receptor_tag = 'EmployerParty', 'EmployeeParty'
+
+    tags = {
+        CAC + emisor_tag: 'emisor',
+        CAC + receptor_tag: 'receptor',
+        CAC + 'PaymentMeans': 'payment',
+        CAC + 'TaxTotal': 'taxes',
+        CAC + 'AdditionalDocumentReference': 'refs',
+        CAC + tag_name + 'Line': 'lines',
+    }
+    tags.update((CAC + tag, 'totals') for tag in UBL_TOTALS.get(tag_name, ('LegalMonetaryTotal',)))
+    anchors = {name: [] for name in tags.values()}
+    for el in root.iter(*tags):
+        anchors[tags[el.tag]].append(el)
+
+    # En facturación las partes son el hijo cac:Party; en nómina el propio nodo
+    if doc_type != "Nómina":
+        for name in ('emisor', 'receptor'):
+            anchors[name] = [party for node in anchors[name] for party in X_PARTY(node)]
+    return anchors
+
+
+def _header_values(root):
+    # Los campos de cabecera están en los hijos directos de la raíz; solo los ausentes
+    # se buscan en el resto del árbol, en un solo recorrido que termina al hallarlos todos
+    first = {}
+    for child in root:
+        if child.tag not in first:
+            first[child.tag] = child
+
+    missing = {CBC + tag for _, tag in HEADER_FIELDS if CBC + tag not in first}
+    if missing:
+        for el in root.iter(*missing):
+            if el.tag in missing:
+                first[el.tag] = el
+                missing.discard(el.tag)
+                if not missing:
+                    break
+
+    values = {}
+    for key, tag in HEADER_FIELDS:
+        node = first.get(CBC + tag)
+        values[key] = node.text if node is not None else ""
+    return values
+
+
+def _party_values(prefix, nodes, doc_type):
+    values = {
+        f'{prefix}Nit': _value(X_PARTY_NIT, nodes) or _value(X_PARTY_ID, nodes),
+        f'{prefix}Nombre': _value(X_PARTY_NAME, nodes) or _value(X_PARTY_REG_NAME, nodes),
+    }
+    if prefix == 'emisor':
+        values['emisorRegimen'] = _value(X_PARTY_REGIMEN, nodes)
+    elif not values['receptorNombre'] and doc_type == "Nómina":
+        values['receptorNombre'] = _value(X_PARTY_FIRST_NAME, nodes) + " " + _value(X_PARTY_FAMILY_NAME, nodes)
+    values.update({
+        f'{prefix}Ciudad': _value(X_PARTY_CITY, nodes),
+        f'{prefix}Depto': _value(X_PARTY_DEPTO, nodes),
+        f'{prefix}Direccion': _value(X_PARTY_ADDRESS, nodes),
+        f'{prefix}Email': _value(X_PARTY_EMAIL, nodes),
+    })
+    return values
+
+
+def _tax_breakdown(tax_totals):
+    taxes = {} # { 'IVA_19.00': {'name': 'IVA', 'rate': '19.00', 'amount': 100}, ... }
+    for tax_total in tax_totals:
+        for sub in X_TAX_SUBTOTAL(tax_total):
+            t_sub = (sub,)
+            t_name = _value(X_TAX_NAME, t_sub) or _value(X_TAX_ID, t_sub)
+            t_percent = _value(X_TAX_PERCENT, t_sub) or "0"
+            t_amount = float(_value(X_TAX_AMOUNT, t_sub) or 0)
+
+            # Crear clave única por nombre y tasa
+            tax_key = f"{t_name}_{t_percent}"
+            if tax_key not in taxes:
+                taxes[tax_key] = {'name': t_name, 'rate': t_percent, 'amount': 0}
+            taxes[tax_key]['amount'] += t_amount
+    return taxes
+
+
+def tax_totals_by_name(taxes):
+    # Pivote por nombre de impuesto: monto total y tasas distintas (ordenadas) aplicadas
+    by_name = {} # { 'IVA': {'amount': 105, 'rates': ['19.00', '5.00']}, ... }
+    for tax in taxes.values():
+        entry = by_name.get(tax['name'])
+        if entry is None:
+            entry = by_name[tax['name']] = {'amount': 0, 'rates': []}
+        entry['amount'] += tax['amount']
+        if tax['rate'] not in entry['rates']:
+            entry['rates'].append(tax['rate'])
+    for entry in by_name.values():
+        entry['rates'].sort()
+    return by_name
+
+
+def _without_extensions(data):
+    # Corta el bloque UBLExtensions de los bytes crudos para que libxml2 nunca lo construya.
+    # Solo se busca antes del primer CDATA, donde un AttachedDocument embebe otro documento
+    limit = data.find(b'<![CDATA[')
+    if limit < 0:
+        limit = len(data)
+    match = EXTENSIONS_OPEN.search(data, 0, limit)
+    if not match:
+        return None
+    prefix = re.escape(match.group(1) or b'')
+    close = re.compile(rb'</' + prefix + rb'UBLExtensions\s*>').search(data, match.end(), limit)
+    if not close:
+        return None
+    return data[:match.start()], data[close.end():]
+
+
+class ZipMember(namedtuple('ZipMember', 'archive name')):
+    # XML dentro de un .zip, leído en memoria sin extraerlo a disco
+    __slots__ = ()
+
+    def __str__(self):
+        return f"{self.archive}!{self.name}"
+
+
+# Archivos .zip abiertos por proceso, para no releer el directorio central en cada miembro
+_zip_handles = {}
+
+
+def _zip_handle(archive):
+    handle = _zip_handles.get(archive)
+    if handle is None:
+        if len(_zip_handles) >= 4:
+            _zip_handles.pop(next(iter(_zip_handles))).close()
+        handle = _zip_handles[archive] = zipfile.ZipFile(archive)
+    return handle
+
+
+def close_zip_handles():
+    while _zip_handles:
+        _zip_handles.popitem()[1].close()
+
+
+def source_path(source):
+    # Ruta en disco de la que depende el documento (el propio XML o su .zip)
+    return source.archive if isinstance(source, ZipMember) else source
+
+
+def source_name(source):
+    return os.path.basename(source.name if isinstance(source, ZipMember) else source)
+
+
+# Los ZipFile abiertos se comparten entre los hilos de lectura anticipada
+_zip_lock = threading.Lock()
+
+
+def read_source(source):
+    if isinstance(source, ZipMember):
+        with _zip_lock:
+            return _zip_handle(source.archive).read(source.name)
+    with open(source, 'rb') as f:
+        return f.read()
+
+
+def _read_task(source, timed):
+    # (ruta, bytes, error, tiempos); los tiempos son los del hilo que leyó
+    timings = {} if timed else None
+    wall, cpu = time.perf_counter(), time.thread_time()
+    try:
+        data = read_source(source)
+    except Exception as e:
+        return source, None, f"{type(e).__name__}: {e}", timings
+    if timed:
+        timings['size'] = len(data)
+        timings['read'] = (time.perf_counter() - wall, time.thread_time() - cpu)
+    return source, data, None, timings
+
+
+def read_ahead(sources, threads=READ_AHEAD_THREADS, max_bytes=READ_AHEAD_BYTES, timed=False):
+    # Genera (ruta, bytes, error, tiempos) en el orden de entrada mientras un pool de hilos lee
+    # los archivos siguientes. Hay a lo sumo threads * READ_AHEAD_FILES lecturas por delante del
+    # consumidor, y no se piden más mientras las ya terminadas sumen max_bytes o más
+    sources = iter(sources)
+    pending = deque()
+    pool = ThreadPoolExecutor(threads, thread_name_prefix="read-ahead")
     try:
+        while True:
+            buffered = sum(len(f.result()[1] or b"") for f in pending if f.done())
+            while len(pending) < threads * READ_AHEAD_FILES and buffered < max_bytes:
+                source = next(sources, None)
+                if source is None:
+                    break
+                pending.append(pool.submit(_read_task, source, timed))
+            if not pending:
+                return
+            yield pending.popleft().result()
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _stat_all(paths, threads):
+    # {ruta: os.stat} de los archivos (o sus .zip) que existen, con varios hilos si hay red
+    def stat(path):
+        try:
+            return os.stat(source_path(path))
+        except OSError:
+            return None
+
+    if threads > 1 and len(paths) > 1:
+        with ThreadPoolExecutor(threads) as pool:
+            results = list(pool.map(stat, paths))
+    else:
+        results = [stat(path) for path in paths]
+    return {path: st for path, st in zip(paths, results) if st is not None}
+
+
+def find_dian_files(folder, recursive=True, include_zip=True, errors=None):
+    # Recorre la carpeta (y sus subcarpetas) con os.scandir y genera las rutas de los .xml;
+    # los .xml contenidos en archivos .zip se generan como ZipMember
+    pending = [folder]
+    while pending:
+        current = pending.pop()
+        try:
+            with os.scandir(current) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError as e:
+            if errors is not None:
+                errors.append((current, f"{type(e).__name__}: {e}"))
+            continue
+
+        subdirs = []
+        for entry in entries:
+            name = entry.name.lower()
+            if entry.is_dir(follow_symlinks=False):
+                if recursive:
+                    subdirs.append(entry.path)
+            elif name.endswith('.xml'):
+                yield entry.path
+            elif include_zip and name.endswith('.zip'):
+                yield from zip_members(entry.path, errors)
+        pending.extend(reversed(subdirs))
+
+
+def zip_members(archive, errors=None):
+    # Los .xml de un .zip como ZipMember; un .zip ilegible se reporta en errors
+    try:
+        with zipfile.ZipFile(archive) as zf:
+            members = [info.filename for info in zf.infolist()
+                       if not info.is_dir() and info.filename.lower().endswith('.xml')]
+    except (OSError, zipfile.BadZipFile) as e:
+        if errors is not None:
+            errors.append((archive, f"{type(e).__name__}: {e}"))
+        return []
+    return [ZipMember(archive, member) for member in members]
+
+
+def _root_from_bytes(data, skip_extensions=True):
+    parser = etree.XMLParser(recover=True, remove_comments=True)
+    chunks = (_without_extensions(data) if skip_extensions else None) or (data,)
+    for chunk in chunks:
+        parser.feed(chunk)
+    return _checked_root(parser.close)
+
+
+def _checked_root(parse):
+    # Con recover=True un archivo que no es XML llega sin raíz, y uno vacío falla con un
+    # XMLSyntaxError; ambos se informan igual
+    try:
+        root = parse()
+    except etree.XMLSyntaxError:
+        root = None
+    if root is None:
+        raise ValueError("El archivo no es un XML válido")
+    return root
+
+
+def load_dian_root(source, skip_extensions=True):
+    if not skip_extensions and not isinstance(source, ZipMember):
         parser = etree.XMLParser(recover=True, remove_comments=True)
-        tree = etree.parse(file_path, parser=parser)
-        root = tree.getroot()
-        
-        # Namespaces
-        ns = {
-            'cac': "urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2",
-            'cbc': "urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2",
-            'ext': "urn:oasis:names:specification:ubl:schema:xsd:CommonExtensionComponents-2",
-            'sts': "dian:gov:co:facturaelectronica:Structures-2-1"
-        }
-
-        tag_name = etree.QName(root).localname
-        
-        doc_type = "Desconocido"
-        if tag_name == "Invoice": doc_type = "Factura"
-        elif tag_name == "CreditNote": doc_type = "Nota Crédito"
-        elif tag_name == "DebitNote": doc_type = "Nota Débito"
-        elif tag_name == "NominaElectronica": doc_type = "Nómina"
-
-        # 1. Cabecera (Header)
-        data = {
-            'documentType': tag_name,
-            'tipoDocLabel': doc_type,
-            'ublVersion': get_tag_value(root, "//cbc:UBLVersionID", ns),
-            'customizationID': get_tag_value(root, "//cbc:CustomizationID", ns),
-            'profileID': get_tag_value(root, "//cbc:ProfileID", ns),
-            'profileExecutionID': get_tag_value(root, "//cbc:ProfileExecutionID", ns),
-            'numero': get_tag_value(root, "//cbc:ID", ns),
-            'cufe': get_tag_value(root, "//cbc:UUID", ns),
-            'fechaEmision': get_tag_value(root, "//cbc:IssueDate", ns),
-            'horaEmision': get_tag_value(root, "//cbc:IssueTime", ns),
-            'fechaVencimiento': get_tag_value(root, "//cbc:DueDate", ns),
-            'tipoFactura': get_tag_value(root, "//cbc:InvoiceTypeCode", ns),
-            'moneda': get_tag_value(root, "//cbc:DocumentCurrencyCode", ns),
-            'notas': get_tag_value(root, "//cbc:Note", ns),
-            'lineasCount': get_tag_value(root, "//cbc:LineCountNumeric", ns),
-            'fileName': os.path.basename(file_path)
-        }
-
-        # 2. Emisor (Supplier/Employer)
-        emisor_xpath = "//cac:AccountingSupplierParty/cac:Party" if doc_type != "Nómina" else "//cac:EmployerParty"
-        data.update({
-            'emisorNit': get_tag_value(root, f"{emisor_xpath}//cbc:CompanyID", ns) or get_tag_value(root, f"{emisor_xpath}//cbc:ID", ns),
-            'emisorNombre': get_tag_value(root, f"{emisor_xpath}//cac:PartyName/cbc:Name", ns) or get_tag_value(root, f"{emisor_xpath}//cbc:RegistrationName", ns),
-            'emisorRegimen': get_tag_value(root, f"{emisor_xpath}//cbc:TaxLevelCode", ns),
-            'emisorCiudad': get_tag_value(root, f"{emisor_xpath}//cbc:CityName", ns),
-            'emisorDepto': get_tag_value(root, f"{emisor_xpath}//cbc:CountrySubentity", ns),
-            'emisorDireccion': get_tag_value(root, f"{emisor_xpath}//cac:AddressLine/cbc:Line", ns),
-            'emisorEmail': get_tag_value(root, f"{emisor_xpath}//cbc:ElectronicMail", ns),
-        })
+        return _checked_root(lambda: etree.parse(source, parser=parser).getroot())
+    return _root_from_bytes(read_source(source), skip_extensions)
 
-        # 3. Adquiriente (Customer/Employee)
-        receptor_xpath = "//cac:AccountingCustomerParty/cac:Party" if doc_type != "Nómina" else "//cac:EmployeeParty"
-        data.update({
-            'receptorNit': get_tag_value(root, f"{receptor_xpath}//cbc:CompanyID", ns) or get_tag_value(root, f"{receptor_xpath}//cbc:ID", ns),
-            'receptorNombre': get_tag_value(root, f"{receptor_xpath}//cac:PartyName/cbc:Name", ns) or get_tag_value(root, f"{receptor_xpath}//cbc:RegistrationName", ns) or \
-                              (get_tag_value(root, f"{receptor_xpath}//cbc:FirstName", ns) + " " + get_tag_value(root, f"{receptor_xpath}//cbc:FamilyName", ns) if doc_type == "Nómina" else ""),
-            'receptorCiudad': get_tag_value(root, f"{receptor_xpath}//cbc:CityName", ns),
-            'receptorDepto': get_tag_value(root, f"{receptor_xpath}//cbc:CountrySubentity", ns),
-            'receptorDireccion': get_tag_value(root, f"{receptor_xpath}//cac:AddressLine/cbc:Line", ns),
-            'receptorEmail': get_tag_value(root, f"{receptor_xpath}//cbc:ElectronicMail", ns),
-        })
 
-        # 4. Pagos (PaymentMeans / PaymentTerms)
-        data.update({
-            'metodoPago': get_tag_value(root, "//cac:PaymentMeans/cbc:PaymentMeansCode", ns),
-            'canalPago': get_tag_value(root, "//cac:PaymentMeans/cbc:ID", ns),
-            'fechaLimitePago': get_tag_value(root, "//cac:PaymentMeans/cbc:PaymentDueDate", ns),
+def document_key(doc):
+    # Identidad de un documento: el CUFE/CUDE, o NIT emisor + número + tipo si no lo trae
+    cufe = (doc.get('cufe') or '').strip().lower()
+    if cufe:
+        return cufe
+    if doc.get('numero'):
+        return (doc.get('emisorNit') or '', doc['numero'], doc.get('documentType') or '')
+    return None
+
+
+class DocumentIndex:
+    # Índice hash de los documentos ya cargados para descartar duplicados al ingresar
+    def __init__(self):
+        self.keys = set()
+        self.duplicates = []
+
+    def add(self, doc, file_path=None):
+        key = document_key(doc)
+        if key is not None:
+            if key in self.keys:
+                self.duplicates.append(file_path or doc.get('fileName', ''))
+                return False
+            self.keys.add(key)
+        return True
+
+    def skip(self, file_path):
+        self.duplicates.append(file_path)
+
+    def remove(self, doc):
+        # Libera la llave de un documento que se va a reemplazar (archivo modificado o borrado)
+        key = document_key(doc)
+        if key is not None:
+            self.keys.discard(key)
+
+    @property
+    def skipped(self):
+        return len(self.duplicates)
+
+
+def _extract_document(source, skip_extensions=True, skip_keys=None):
+    root = load_dian_root(source, skip_extensions)
+    return _extract_root(root, source_name(source), skip_keys)
+
+
+def _extract_bytes_timed(source, data, skip_extensions, skip_keys, timings):
+    # Igual que _extract_root sobre los bytes ya leídos, anotando en timings (wall, cpu) del
+    # parseo de lxml y de la extracción
+    wall, cpu = time.perf_counter(), time.thread_time()
+    root = _root_from_bytes(data, skip_extensions)
+    timings['parse'] = (time.perf_counter() - wall, time.thread_time() - cpu)
+
+    wall, cpu = time.perf_counter(), time.thread_time()
+    doc = _extract_root(root, source_name(source), skip_keys)
+    timings['extract'] = (time.perf_counter() - wall, time.thread_time() - cpu)
+    return doc
+
+
+NOT_EMBEDDED = object()
+
+
+def _extract_attached(root, file_name, skip_keys=None):
+    # Parsea el documento embebido directamente desde el texto del CDATA. Devuelve
+    # NOT_EMBEDDED si el contenedor no trae un XML legible, para leer el sobre como antes
+    content = _value(X_ATTACHED_CONTENT, (root,))
+    if not content or '<' not in content:
+        return NOT_EMBEDDED
+    # lxml no acepta texto con declaración de codificación: se quita y se pasa como UTF-8
+    inner = _root_from_bytes(XML_DECLARATION.sub('', content, 1).encode('utf-8'))
+    if inner is None:
+        return NOT_EMBEDDED
+
+    data = _extract_root(inner, file_name, skip_keys)
+    if data is None:
+        return None
+
+    root_ctx = (root,)
+    parent_ref = X_ATTACHED_PARENT_REF(root)
+    if not data['cufe']:
+        data['cufe'] = _value(X_ATTACHED_PARENT_UUID, parent_ref)
+        if skip_keys and document_key(data) in skip_keys:
+            return None
+    data.update({
+        'contenedorNumero': _value(X_ATTACHED_ID, root_ctx),
+        'contenedorFecha': _value(X_ATTACHED_DATE, root_ctx),
+        'validacionDian': _value(X_ATTACHED_RESULT, parent_ref),
+        'fechaValidacionDian': _value(X_ATTACHED_RESULT_DATE, parent_ref),
+    })
+    return data
+
+
+def _extract_root(root, file_name, skip_keys=None):
+    tag_name = etree.QName(root).localname
+    extractor = EXTRACTORS.get(tag_name, _extract_ubl)
+    return extractor(root, tag_name, file_name, skip_keys)
+
+
+def _extract_attached_document(root, tag_name, file_name, skip_keys=None):
+    data = _extract_attached(root, file_name, skip_keys)
+    if data is NOT_EMBEDDED:
+        return _extract_ubl(root, tag_name, file_name, skip_keys)
+    return data
+
+
+def _extract_ubl(root, tag_name, file_name, skip_keys=None):
+    doc_type = DOC_TYPE_LABELS.get(tag_name, "Desconocido")
+    anchors = _collect_anchors(root, tag_name, doc_type)
+
+    # 1. Cabecera (Header)
+    data = {
+        'documentType': tag_name,
+        'tipoDocLabel': doc_type,
+    }
+    data.update(_header_values(root))
+    data['fileName'] = file_name
+
+    # 2. Emisor (Supplier/Employer)
+    data.update(_party_values('emisor', anchors['emisor'], doc_type))
+
+    # Un duplicado ya conocido se descarta antes de expandir sus líneas
+    if skip_keys and document_key(data) in skip_keys:
+        return None
+
+    # 3. Adquiriente (Customer/Employee)
+    data.update(_party_values('receptor', anchors['receptor'], doc_type))
+
+    # 4. Pagos (PaymentMeans / PaymentTerms)
+    payment = anchors['payment']
+    data.update({
+        'metodoPago': _value(X_PAYMENT_CODE, payment),
+        'canalPago': _value(X_PAYMENT_ID, payment),
+        'fechaLimitePago': _value(X_PAYMENT_DUE, payment),
+    })
+
+    # 5. Totales (MonetaryTotal)
+    totals = anchors['totals']
+    for key, _ in TOTAL_FIELDS:
+        data[key] = float(_value(X_TOTALS[key], totals) or 0)
+
+    # 6. Impuestos Detallados (Global)
+    global_taxes = _tax_breakdown(t for t in anchors['taxes'] if not t.getparent().tag.endswith('Line'))
+    data['impuestosDesglose'] = global_taxes
+    data['totalImpuestos'] = sum(t['amount'] for t in global_taxes.values())
+    data['impuestosPorNombre'] = tax_totals_by_name(global_taxes)
+
+    # 7. Información Sectorial (Anexo 1.9 - Salud, Transporte, etc.)
+    # Salud (Resolución 2275 - Código 050) y Transporte (Códigos 06 al 09)
+    health_fields = {}
+    trans_fields = {}
+    for ref in anchors['refs']:
+        ref_types = [node.text for node in X_REF_TYPE(ref)]
+        if '050' in ref_types:
+            field_code = _value(X_REF_ISSUER_ID, (ref,))
+            if field_code:
+                health_fields[f'Salud_Campo_{field_code}'] = _value(X_REF_ID, (ref,))
+        if any(t in TRANSPORT_LABELS for t in ref_types):
+            t_type = _value(X_REF_TYPE, (ref,))
+            label = TRANSPORT_LABELS.get(t_type, t_type)
+            trans_fields[f'Transporte_{label}'] = _value(X_REF_ID, (ref,))
+    data.update(health_fields)
+    data.update(trans_fields)
+
+    # 8. Líneas de Detalle (Items)
+    quantity = X_LINE_QUANTITY.get(tag_name, X_LINE_QUANTITY['Invoice'])
+    unit = X_LINE_UNIT.get(tag_name, X_LINE_UNIT['Invoice'])
+    items = []
+    for line in anchors['lines']:
+        line_ctx = (line,)
+        line_taxes = _tax_breakdown(X_LINE_TAX_TOTAL(line))
+        items.append({
+            'lineId': _value(X_LINE_ID, line_ctx),
+            'descripcion': _value(X_LINE_DESCRIPTION, line_ctx),
+            'cantidad': float(_value(quantity, line_ctx) or 0),
+            'unidadMedida': _value(unit, line_ctx),
+            'precioUnitario': float(_value(X_LINE_PRICE, line_ctx) or 0),
+            'lineaBase': float(_value(X_LINE_BASE, line_ctx) or 0),
+            'lineaImpuestos': sum(t['amount'] for t in line_taxes.values()),
+            'lineaImpuestosDetalle': line_taxes,
+            'lineaImpuestosPorNombre': tax_totals_by_name(line_taxes),
+            'codigoEstandar': _value(X_LINE_STANDARD_CODE, line_ctx),
+            'marca': _value(X_LINE_BRAND, line_ctx),
+            'modelo': _value(X_LINE_MODEL, line_ctx),
         })
 
-        # 5. Totales (MonetaryTotal)
-        totals_xpath = "//cac:LegalMonetaryTotal" if doc_type != "Nómina" else "//cac:RequestedMonetaryTotal"
-        data.update({
-            'totalBruto': float(get_tag_value(root, f"{totals_xpath}/cbc:LineExtensionAmount", ns) or 0),
-            'baseImponible': float(get_tag_value(root, f"{totals_xpath}/cbc:TaxExclusiveAmount", ns) or 0),
-            'totalIvaInc': float(get_tag_value(root, f"{totals_xpath}/cbc:TaxInclusiveAmount", ns) or 0),
-            'totalDescuentos': float(get_tag_value(root, f"{totals_xpath}/cbc:AllowanceTotalAmount", ns) or 0),
-            'totalCargos': float(get_tag_value(root, f"{totals_xpath}/cbc:ChargeTotalAmount", ns) or 0),
-            'totalAnticipos': float(get_tag_value(root, f"{totals_xpath}/cbc:PrepaidAmount", ns) or 0),
-            'totalPagar': float(get_tag_value(root, f"{totals_xpath}/cbc:PayableAmount", ns) or 0),
+    data['items'] = items
+    return data
+
+
+def _nomina_amount(node):
+    amount = 0.0
+    if node.text and node.text.strip():
+        try:
+            amount = float(node.text)
+        except ValueError:
+            pass
+    return amount + sum(float(node.get(attr)) for attr in NOMINA_AMOUNT_ATTRS if node.get(attr))
+
+
+def _nomina_concepts(section, sign, label, items):
+    # Cada concepto (nodo hoja de Devengados/Deducciones) es una línea; las deducciones
+    # van en negativo para que las líneas sumen el neto pagado
+    for node in section.iter(etree.Element):
+        if node is section or len(node):
+            continue
+        concept = etree.QName(node).localname
+        description = next((node.get(attr) for attr in NOMINA_DESCRIPTION_ATTRS if node.get(attr)), "")
+        quantity = next((node.get(attr) for attr in NOMINA_QUANTITY_ATTRS if node.get(attr)), "")
+        items.append({
+            'lineId': str(len(items) + 1),
+            'descripcion': f"{label}: {concept}" + (f" - {description}" if description else ""),
+            'cantidad': float(quantity or 0),
+            'unidadMedida': "",
+            'precioUnitario': 0.0,
+            'lineaBase': sign * _nomina_amount(node),
+            'lineaImpuestos': 0,
+            'lineaImpuestosDetalle': {},
+            'lineaImpuestosPorNombre': {},
+            'codigoEstandar': concept,
+            'marca': "",
+            'modelo': "",
         })
 
-        # 6. Impuestos Detallados (Global)
-        tax_totals = root.xpath("//cac:TaxTotal", namespaces=ns)
-        global_taxes = {} # { 'IVA_19.00': {'name': 'IVA', 'rate': '19.00', 'amount': 100}, ... }
-        for tax_total in tax_totals:
-            if tax_total.getparent().tag.endswith('Line'): continue
-            
-            subtotals = tax_total.xpath("cac:TaxSubtotal", namespaces=ns)
-            for sub in subtotals:
-                t_id = get_tag_value(sub, "cac:TaxCategory/cac:TaxScheme/cbc:ID", ns)
-                t_name = get_tag_value(sub, "cac:TaxCategory/cac:TaxScheme/cbc:Name", ns) or t_id
-                t_percent = get_tag_value(sub, "cac:TaxCategory/cbc:Percent", ns) or "0"
-                t_amount = float(get_tag_value(sub, "cbc:TaxAmount", ns) or 0)
-                
-                # Crear clave única por nombre y tasa
-                tax_key = f"{t_name}_{t_percent}"
-                if tax_key not in global_taxes:
-                    global_taxes[tax_key] = {'name': t_name, 'rate': t_percent, 'amount': 0}
-                global_taxes[tax_key]['amount'] += t_amount
-
-        data['impuestosDesglose'] = global_taxes
-        data['totalImpuestos'] = sum(t['amount'] for t in global_taxes.values())
-
-        # 7. Información Sectorial (Anexo 1.9 - Salud, Transporte, etc.)
-        # Sector Salud (Resolución 2275 - Código 050)
-        health_refs = root.xpath("//cac:AdditionalDocumentReference[cbc:DocumentTypeCode='050']", namespaces=ns)
-        for ref in health_refs:
-            field_code = get_tag_value(ref, "cac:IssuerParty/cac:PartyIdentification/cbc:ID", ns)
-            field_val = get_tag_value(ref, "cbc:ID", ns)
-            if field_code:
-                data[f'Salud_Campo_{field_code}'] = field_val
-
-        # Sector Transporte (Códigos 06 al 09)
-        trans_refs = root.xpath("//cac:AdditionalDocumentReference[cbc:DocumentTypeCode='06' or cbc:DocumentTypeCode='07' or cbc:DocumentTypeCode='08' or cbc:DocumentTypeCode='09']", namespaces=ns)
-        for ref in trans_refs:
-            t_type = get_tag_value(ref, "cbc:DocumentTypeCode", ns)
-            t_id = get_tag_value(ref, "cbc:ID", ns)
-            label = {'06': 'Manifiesto', '07': 'Remesa', '08': 'DTA', '09': 'OTM'}.get(t_type, t_type)
-            data[f'Transporte_{label}'] = t_id
-
-        # 8. Líneas de Detalle (Items)
-        items = []
-        line_xpath = f"//cac:{tag_name}Line"
-        lines = root.xpath(line_xpath, namespaces=ns)
-        for line in lines:
-            line_taxes = {} # { 'IVA_19.00': {'name': 'IVA', 'rate': '19.00', 'amount': 10}, ... }
-            item_tax_totals = line.xpath("cac:TaxTotal", namespaces=ns)
-            for it_tax in item_tax_totals:
-                it_subtotals = it_tax.xpath("cac:TaxSubtotal", namespaces=ns)
-                for it_sub in it_subtotals:
-                    it_tax_name = get_tag_value(it_sub, "cac:TaxCategory/cac:TaxScheme/cbc:Name", ns) or \
-                                  get_tag_value(it_sub, "cac:TaxCategory/cac:TaxScheme/cbc:ID", ns)
-                    it_percent = get_tag_value(it_sub, "cac:TaxCategory/cbc:Percent", ns) or "0"
-                    it_tax_amount = float(get_tag_value(it_sub, "cbc:TaxAmount", ns) or 0)
-                    
-                    it_key = f"{it_tax_name}_{it_percent}"
-                    if it_key not in line_taxes:
-                        line_taxes[it_key] = {'name': it_tax_name, 'rate': it_percent, 'amount': 0}
-                    line_taxes[it_key]['amount'] += it_tax_amount
-
-            items.append({
-                'lineId': get_tag_value(line, "cbc:ID", ns),
-                'descripcion': get_tag_value(line, "cac:Item/cbc:Description", ns),
-                'cantidad': float(get_tag_value(line, "cbc:InvoicedQuantity", ns) or 0),
-                'unidadMedida': get_tag_value(line, "cbc:InvoicedQuantity/@unitCode", ns),
-                'precioUnitario': float(get_tag_value(line, "cac:Price/cbc:PriceAmount", ns) or 0),
-                'lineaBase': float(get_tag_value(line, "cbc:LineExtensionAmount", ns) or 0),
-                'lineaImpuestos': sum(t['amount'] for t in line_taxes.values()),
-                'lineaImpuestosDetalle': line_taxes,
-                'codigoEstandar': get_tag_value(line, "cac:Item/cac:StandardItemIdentification/cbc:ID", ns),
-                'marca': get_tag_value(line, "cac:Item/cbc:BrandName", ns),
-                'modelo': get_tag_value(line, "cac:Item/cbc:ModelName", ns),
-            })
-        
-        data['items'] = items
-        return data
 
+def _extract_nomina(root, tag_name, file_name, skip_keys=None):
+    # Los datos viajan en atributos de hijos directos de la raíz: no se recorre el árbol.
+    # La nómina de ajuste los trae dentro de Reemplazar (o Eliminar)
+    parent = root
+    for child in root.iterchildren(etree.Element):
+        if etree.QName(child).localname in ('Reemplazar', 'Eliminar'):
+            parent = child
+            break
+    nodes = {}
+    for child in parent.iterchildren(etree.Element):
+        nodes.setdefault(etree.QName(child).localname, child)
+    empty = etree.Element('vacio')
+
+    def node(name):
+        found = nodes.get(name)
+        return found if found is not None else empty
+
+    def text(name):
+        found = nodes.get(name)
+        return (found.text or "") if found is not None else ""
+
+    general = node('InformacionGeneral')
+    sequence = node('NumeroSecuenciaXML')
+    period = node('Periodo')
+    employer = node('Empleador')
+    employee = node('Trabajador')
+    payment = node('Pago')
+
+    data = {
+        'documentType': tag_name,
+        'tipoDocLabel': DOC_TYPE_LABELS.get(tag_name, "Nómina"),
+    }
+    data.update((key, "") for key, _ in HEADER_FIELDS)
+    data.update({
+        'numero': sequence.get('Numero', ""),
+        'cufe': general.get('CUNE', ""),
+        'fechaEmision': general.get('FechaGen', "") or period.get('FechaGen', ""),
+        'horaEmision': general.get('HoraGen', ""),
+        'moneda': general.get('TipoMoneda', ""),
+        'notas': text('Notas'),
+        'fileName': file_name,
+        # Empleador
+        'emisorNit': employer.get('NIT', ""),
+        'emisorNombre': employer.get('RazonSocial', "") or " ".join(
+            filter(None, (employer.get(attr) for attr in ('PrimerNombre', 'OtrosNombres', 'PrimerApellido', 'SegundoApellido')))),
+        'emisorRegimen': "",
+        'emisorCiudad': employer.get('MunicipioCiudad', ""),
+        'emisorDepto': employer.get('DepartamentoEstado', ""),
+        'emisorDireccion': employer.get('Direccion', ""),
+        'emisorEmail': "",
+    })
+    if skip_keys and document_key(data) in skip_keys:
+        return None
+
+    payment_dates = nodes.get('FechasPagos')
+    data.update({
+        # Trabajador
+        'receptorNit': employee.get('NumeroDocumento', ""),
+        'receptorNombre': " ".join(
+            filter(None, (employee.get(attr) for attr in ('PrimerNombre', 'OtrosNombres', 'PrimerApellido', 'SegundoApellido')))),
+        'receptorCiudad': employee.get('LugarTrabajoMunicipioCiudad', ""),
+        'receptorDepto': employee.get('LugarTrabajoDepartamentoEstado', ""),
+        'receptorDireccion': employee.get('LugarTrabajoDireccion', ""),
+        'receptorEmail': "",
+        'metodoPago': payment.get('Metodo', ""),
+        'canalPago': payment.get('Forma', ""),
+        'fechaLimitePago': (payment_dates[0].text or "") if payment_dates is not None and len(payment_dates) else "",
+        'periodoInicio': period.get('FechaLiquidacionInicio', ""),
+        'periodoFin': period.get('FechaLiquidacionFin', ""),
+    })
+
+    # Devengados como bruto (no hay impuestos: igual al total con impuestos), deducciones
+    # como descuentos y el comprobante como neto pagado
+    earned = float(text('DevengadosTotal') or 0)
+    data.update({key: 0.0 for key, _ in TOTAL_FIELDS})
+    data.update({
+        'totalBruto': earned,
+        'totalIvaInc': earned,
+        'totalDescuentos': float(text('DeduccionesTotal') or 0),
+        'totalPagar': float(text('ComprobanteTotal') or 0),
+        'impuestosDesglose': {},
+        'totalImpuestos': 0,
+        'impuestosPorNombre': {},
+    })
+
+    items = []
+    for name, sign, label in (('Devengados', 1, "Devengado"), ('Deducciones', -1, "Deducción")):
+        if name in nodes:
+            _nomina_concepts(nodes[name], sign, label, items)
+    data['items'] = items
+    return data
+
+
+# Extractor por etiqueta raíz; las demás raíces se leen como UBL
+EXTRACTORS = {
+    'Invoice': _extract_ubl,
+    'CreditNote': _extract_ubl,
+    'DebitNote': _extract_ubl,
+    'AttachedDocument': _extract_attached_document,
+}
+EXTRACTORS.update((tag, _extract_nomina) for tag in NOMINA_ROOTS)
+
+
+def parse_dian_xml(file_path, skip_extensions=True):
+    try:
+        return _extract_document(file_path, skip_extensions)
     except Exception as e:
         print(f"Error parsing {file_path}: {e}")
         return None
+
+
+def parse_dian_bytes(data, file_name="", skip_extensions=True):
+    # Igual que parse_dian_xml, para contenido que ya está en memoria
+    try:
+        return _extract_root(_root_from_bytes(data, skip_extensions), file_name)
+    except Exception as e:
+        print(f"Error parsing {file_name or 'XML en memoria'}: {e}")
+        return None
+
+
+# Claves ya cargadas, copiadas a cada proceso del pool al iniciarlo
+_worker_skip_keys = frozenset()
+
+
+def _init_worker(skip_keys):
+    global _worker_skip_keys
+    _worker_skip_keys = skip_keys
+
+
+def _parse_task(args, skip_keys=None):
+    # Se ejecuta en los procesos del pool: los errores viajan como texto, no se imprimen.
+    # Recibe lo que entrega read_ahead (los bytes ya leídos, o None para leer aquí) y
+    # devuelve (ruta, documento, error); un duplicado descartado vuelve como (ruta, None, None).
+    # Si se están midiendo tiempos se agregan como cuarto elemento
+    file_path, data, error, timings, skip_extensions = args
+    if skip_keys is None:
+        skip_keys = _worker_skip_keys
+    doc = None
+    if error is None:
+        try:
+            if data is None:
+                _, data, error, read_timings = _read_task(file_path, timings is not None)
+                if timings is not None:
+                    timings.update(read_timings)
+            if error is None:
+                if timings is not None:
+                    doc = _extract_bytes_timed(file_path, data, skip_extensions, skip_keys, timings)
+                else:
+                    doc = _extract_root(_root_from_bytes(data, skip_extensions), source_name(file_path), skip_keys)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+    if timings is not None:
+        return file_path, doc, error, timings
+    return file_path, doc, error
+
+
+def parse_dian_folder(paths, workers=None, chunksize=None, ordered=True, skip_extensions=True, cache=None, index=None,
+                      profiler=None, read_threads=READ_AHEAD_THREADS):
+    # Reparte el lote entre varios procesos y genera (ruta, documento, error) a medida
+    # que terminan; documento es None si el archivo falló. ordered=False entrega cada
+    # resultado apenas está listo en lugar de respetar el orden de entrada.
+    # Con una ParseCache solo se parsean los archivos nuevos o modificados, y con un
+    # DocumentIndex los duplicados no se entregan: quedan en index.duplicates.
+    # Acepta rutas y ZipMember, tal como los genera find_dian_files.
+    # Con un Profiler (instrumentation) se registran los tiempos de cada archivo leído.
+    # read_threads hilos leen los archivos por adelantado (read_ahead); con 0 cada proceso
+    # del pool lee los suyos
+    paths = list(paths)
+    cached = {}
+    stats = {}
+    if cache is not None:
+        started = time.perf_counter(), time.thread_time()
+        stats = _stat_all(paths, read_threads)
+        for path in paths:
+            if path not in stats:
+                continue
+            try:
+                payload = cache.get_payload(path, stats[path])
+            except OSError:
+                continue
+            if payload is not None:
+                # Se guarda serializado y se decodifica al entregarlo: así no quedan todos los
+                # documentos de la caché en memoria a la vez
+                cached[path] = payload
+        if profiler is not None:
+            profiler.add_stage('cache', time.perf_counter() - started[0], time.thread_time() - started[1], len(paths))
+
+    misses = [path for path in paths if path not in cached]
+    skip_keys = index.keys if index is not None else None
+    results = _parse_batch(misses, workers, chunksize, ordered, skip_extensions, skip_keys, profiler is not None,
+                           read_threads)
+    if profiler is not None:
+        results = _profiled(results, profiler)
+    try:
+        if ordered:
+            stream = ((path, cache.decode(cached.pop(path)), None) if path in cached
+                      else _store(cache, stats, next(results)) for path in paths)
+        else:
+            stream = itertools.chain(((path, cache.decode(cached.pop(path)), None) for path in list(cached)),
+                                     (_store(cache, stats, result) for result in results))
+        for result in stream:
+            file_path, doc, error = result
+            if index is not None:
+                if doc is None and error is None:
+                    index.skip(file_path)
+                    continue
+                if doc is not None and not index.add(doc, file_path):
+                    continue
+            yield result
+    finally:
+        results.close()
+        close_zip_handles()
+        if cache is not None:
+            cache.flush()
+
+
+def _store(cache, stats, result):
+    file_path, doc, _ = result
+    if cache is not None and doc is not None and file_path in stats:
+        cache.put(file_path, doc, stats[file_path])
+    return result
+
+
+def _profiled(results, profiler):
+    # Separa los tiempos de cada resultado y los entrega al Profiler
+    try:
+        for file_path, doc, error, timings in results:
+            profiler.add_file(file_path, timings, error)
+            yield file_path, doc, error
+    finally:
+        results.close()
+
+
+def _parse_batch(paths, workers, chunksize, ordered, skip_extensions, skip_keys=None, timed=False,
+                 read_threads=READ_AHEAD_THREADS):
+    workers = workers or os.cpu_count() or 1
+    workers = min(workers, len(paths))
+    if read_threads:
+        reads = read_ahead(paths, read_threads, timed=timed)
+    else:
+        reads = ((path, None, None, {} if timed else None) for path in paths)
+    tasks = (read + (skip_extensions,) for read in reads)
+
+    try:
+        if workers <= 1:
+            # En el mismo proceso se consulta el índice vivo, que crece a medida que se ingresa
+            for task in tasks:
+                yield _parse_task(task, skip_keys)
+            return
+
+        if chunksize is None:
+            # Bloques pequeños para que los resultados fluyan pronto, grandes para amortizar el IPC
+            chunksize = max(1, min(64, len(paths) // (workers * 4)))
+
+        # El pool reparte las tareas desde su propio hilo y guarda los resultados sin límite
+        # hasta que se piden: cada tarea toma un cupo que se devuelve al entregar su resultado,
+        # así un consumidor lento frena a los procesos. Como hay más cupos que un bloque
+        # (chunksize), el bloque en armado siempre puede completarse
+        slots = threading.Semaphore(workers * chunksize * IN_FLIGHT_CHUNKS)
+        closed = threading.Event()
+
+        def bounded(tasks):
+            for task in tasks:
+                while not slots.acquire(timeout=0.1):
+                    if closed.is_set():
+                        return
+                yield task
+
+        with multiprocessing.Pool(workers, _init_worker, (frozenset(skip_keys or ()),)) as pool:
+            results = pool.imap(_parse_task, bounded(tasks), chunksize) if ordered else \
+                      pool.imap_unordered(_parse_task, bounded(tasks), chunksize)
+            try:
+                for result in results:
+                    slots.release()
+                    yield result
+            finally:
+                # Suelta el hilo del pool si espera un cupo, para que terminate() no se bloquee
+                closed.set()
+    finally:
+        reads.close()
@@ -0,0 +1,270 @@
+import re
+from collections import namedtuple
+from datetime import date
+
+from document_store import column_array
+
+# Filtros y totales sobre el DocumentStore sin recorrer todos los documentos. Los índices
+# se construyen al primer uso y, como la RowProjection, solo agregan los documentos nuevos
+# cuando el store crece:
+#   emisorNit, receptorNit, tipoDocLabel  código del StringPool -> doc_ids ordenados
+#   fechaEmision                          fechas ordenadas y la posición de cada documento
+#   impuestos                             nombre -> tasa -> doc_ids (en el documento o en sus líneas)
+# Un filtro parte del criterio con menos candidatos y descarta con los demás.
+# numpy se importa en cada función, como en reconciliation
+
+INDEXED_FIELDS = ('emisorNit', 'receptorNit', 'tipoDocLabel')
+DATE_FIELD = 'fechaEmision'
+
+# Seudo-campo de agrupación: AAAA-MM de la fecha de emisión
+MONTH_KEY = 'mes'
+MONTH_LABEL = "Mes"
+
+# Formato de desde/hasta en los filtros
+DATE_FORMAT = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+# Montos que se suman en los totales agrupados: (clave, etiqueta)
+TOTAL_VALUES = [
+    ('totalBruto', "Subtotal Bruto"),
+    ('totalDescuentos', "Descuentos"),
+    ('totalImpuestos', "Total Impuestos"),
+    ('totalPagar', "Total a Pagar"),
+]
+# Documentos que restan en los totales agrupados (una nota crédito anula parte de una factura)
+NEGATIVE_TYPES = ('CreditNote',)
+
+# Cada criterio es opcional (None o ""); emisorNit, receptorNit y tipoDocLabel aceptan
+# también una lista de valores. desde/hasta son fechas AAAA-MM-DD inclusivas
+DocumentFilter = namedtuple('DocumentFilter', 'emisorNit receptorNit tipoDocLabel desde hasta impuesto tasa',
+                            defaults=(None,) * 7)
+
+
+def is_date(value):
+    # AAAA-MM-DD y una fecha que existe (no 2024-13-99)
+    if not DATE_FORMAT.match(value):
+        return False
+    try:
+        date.fromisoformat(value)
+    except ValueError:
+        return False
+    return True
+
+
+def _values(value):
+    return [value] if isinstance(value, str) else list(value)
+
+
+def _grouped(keys, doc_ids):
+    # (clave, doc_ids ordenados y sin repetir) por cada clave distinta
+    import numpy as np
+
+    if not len(keys):
+        return
+    # Clave (renumerada 0..k-1, para no desbordar int64) y doc_id en un solo entero: un sort
+    # deja cada clave con sus doc_ids en orden
+    unique, keys = np.unique(keys, return_inverse=True)
+    span = int(doc_ids.max()) + 1
+    pairs = np.sort(keys.ravel().astype(np.int64) * span + doc_ids)
+    pairs = pairs[np.r_[True, pairs[1:] != pairs[:-1]]]
+    keys, doc_ids = np.divmod(pairs, span)
+    cuts = np.flatnonzero(np.diff(keys)) + 1
+    yield from zip(unique[keys[np.r_[0, cuts]]].tolist(), np.split(doc_ids, cuts))
+
+
+def _append(index, key, ids):
+    # Los doc_ids nuevos siempre son mayores que los ya indexados
+    import numpy as np
+
+    old = index.get(key)
+    index[key] = ids if old is None else np.concatenate((old, ids))
+
+
+class DocumentQuery:
+    def __init__(self, store):
+        self.store = store
+        self._indexed = 0
+        self._fields = {field: {} for field in INDEXED_FIELDS}
+        self._taxes = {}
+        self._date_keys = None
+        self._date_docs = None
+        self._date_rank = None
+
+    def update(self):
+        # Agrega a los índices los documentos que llegaron al store desde la última consulta
+        import numpy as np
+
+        store = self.store
+        start, stop = self._indexed, len(store)
+        if start == stop:
+            return
+        new_docs = np.arange(start, stop)
+        for field, index in self._fields.items():
+            for code, ids in _grouped(column_array(store.doc_text[field], start, stop), new_docs):
+                _append(index, code, ids)
+
+        # Impuestos globales y de línea, cada uno con el documento al que pertenece
+        strings = store.strings
+        tax_lo, tax_hi = store.doc_tax_start[start], store.doc_tax_start[stop]
+        line_lo, line_hi = store.doc_line_start[start], store.doc_line_start[stop]
+        line_tax_lo, line_tax_hi = store.line_tax_start[line_lo], store.line_tax_start[line_hi]
+        line_doc = column_array(store.line_doc, 0, line_hi)
+        docs = np.concatenate((
+            column_array(store.doc_tax_doc, tax_lo, tax_hi),
+            line_doc[column_array(store.line_tax_line, line_tax_lo, line_tax_hi)]))
+        names = np.concatenate((column_array(store.doc_tax_name, tax_lo, tax_hi),
+                                column_array(store.line_tax_name, line_tax_lo, line_tax_hi)))
+        rates = np.concatenate((column_array(store.doc_tax_rate, tax_lo, tax_hi),
+                                column_array(store.line_tax_rate, line_tax_lo, line_tax_hi)))
+        for name, ids in _grouped(names, docs):
+            _append(self._taxes.setdefault(strings[name], {}), None, ids)
+        # Nombre y tasa se renumeran antes de combinarlos: el producto de dos códigos del
+        # StringPool puede desbordar int64
+        name_codes, name_of = np.unique(names, return_inverse=True)
+        rate_codes, rate_of = np.unique(rates, return_inverse=True)
+        pairs = name_of.ravel().astype(np.int64) * len(rate_codes) + rate_of.ravel()
+        for pair, ids in _grouped(pairs, docs):
+            name, rate = divmod(pair, len(rate_codes))
+            _append(self._taxes[strings[int(name_codes[name])]], strings[int(rate_codes[rate])], ids)
+
+        # Índice de fechas: el orden estable conserva el de los documentos con la misma fecha
+        dates = np.array([strings[code] for code in store.doc_text[DATE_FIELD][start:stop]], dtype=str)
+        if self._date_keys is not None:
+            dates = np.concatenate((self._date_keys, dates))
+            new_docs = np.concatenate((self._date_docs, new_docs))
+        order = np.argsort(dates, kind='stable')
+        self._date_keys = dates[order]
+        self._date_docs = new_docs[order]
+        self._date_rank = np.empty(stop, dtype=np.intp)
+        self._date_rank[self._date_docs] = np.arange(stop)
+        self._indexed = stop
+
+    def select(self, flt):
+        # doc_ids vigentes (en orden del store) que cumplen todos los criterios del filtro
+        import numpy as np
+
+        self.update()
+        store = self.store
+        count = self._indexed
+        if not count:
+            return []
+        strings = store.strings
+        criteria = []  # (candidatos, función que los produce, máscara sobre unos doc_ids)
+
+        for field in INDEXED_FIELDS:
+            wanted = getattr(flt, field)
+            if not wanted:
+                continue
+            codes = [strings.codes[value] for value in _values(wanted) if value in strings.codes]
+            lists = [self._fields[field][code] for code in codes if code in self._fields[field]]
+            column = store.doc_text[field]
+            criteria.append((sum(map(len, lists)),
+                             lambda lists=lists: np.sort(np.concatenate(lists)) if lists else np.empty(0, np.intp),
+                             lambda ids, column=column, codes=codes: np.isin(column_array(column, 0, count)[ids], codes)))
+
+        if flt.desde or flt.hasta:
+            keys = self._date_keys
+            # Los documentos sin fecha ("") quedan fuera
+            lo = np.searchsorted(keys, flt.desde, 'left') if flt.desde else np.searchsorted(keys, "", 'right')
+            hi = max(lo, np.searchsorted(keys, flt.hasta, 'right') if flt.hasta else len(keys))
+            rank = self._date_rank
+            criteria.append((hi - lo, lambda: np.sort(self._date_docs[lo:hi]),
+                             lambda ids: (rank[ids] >= lo) & (rank[ids] < hi)))
+
+        if flt.impuesto or flt.tasa:
+            tax_ids = self._tax_docs(flt.impuesto, flt.tasa)
+            criteria.append((len(tax_ids), lambda: tax_ids, lambda ids: np.isin(ids, tax_ids)))
+
+        if criteria:
+            criteria.sort(key=lambda c: c[0])
+            selected = criteria[0][1]()
+            for _, _, mask in criteria[1:]:
+                if not len(selected):
+                    break
+                selected = selected[mask(selected)]
+        else:
+            selected = np.arange(count)
+        if store.removed:
+            live = column_array(store.doc_live, 0, count)
+            selected = selected[live[selected] != 0]
+        return selected.tolist()
+
+    def _tax_docs(self, name, rate):
+        # doc_ids con el impuesto (a cualquier tasa si rate está vacío); sin nombre, con la
+        # tasa en cualquier impuesto
+        import numpy as np
+
+        if rate and '.' not in rate:
+            # Las tasas vienen del XML con dos decimales (19.00)
+            rate += ".00"
+        names = [name] if name else list(self._taxes)
+        lists = [self._taxes[n][rate or None] for n in names if (rate or None) in self._taxes.get(n, {})]
+        if not lists:
+            return np.empty(0, np.intp)
+        return lists[0] if len(lists) == 1 else np.unique(np.concatenate(lists))
+
+    def group_totals(self, doc_ids, keys, values=TOTAL_VALUES):
+        # [fila] por combinación de claves, ordenadas: valores de las claves, número de
+        # documentos y la suma de cada monto (negativo en NEGATIVE_TYPES). keys son campos de
+        # cabecera o MONTH_KEY
+        import numpy as np
+
+        if not len(doc_ids):
+            return []
+        store = self.store
+        strings = store.strings
+        count = len(store)
+        ids = np.asarray(doc_ids, dtype=np.intp)
+
+        # Cada clave se renumera 0..k-1 según sus valores distintos y las claves se combinan
+        # en un solo entero por documento, que se vuelve a renumerar tras cada clave para que
+        # no pase de documentos x valores
+        combined = np.zeros(len(ids), dtype=np.int64)
+        steps = []  # (valores de la clave, enteros combinados distintos hasta esa clave)
+        for key in keys:
+            column = store.doc_text.get(DATE_FIELD if key == MONTH_KEY else key)
+            if column is None:
+                column = store.doc_extra.get(key)
+            if column is None:
+                raise ValueError(f"No se puede agrupar por '{key}'")
+            unique, inverse = np.unique(column_array(column, 0, count)[ids], return_inverse=True)
+            names = [strings[code] for code in unique.tolist()]
+            if key == MONTH_KEY:
+                # Varias fechas caen en el mismo mes
+                months = sorted(set(name[:7] for name in names))
+                position = {month: i for i, month in enumerate(months)}
+                inverse = np.array([position[name[:7]] for name in names], dtype=np.int64)[inverse.ravel()]
+                names = months
+            seen, combined = np.unique(combined * len(names) + inverse.ravel(), return_inverse=True)
+            combined = combined.ravel()
+            steps.append((names, seen))
+
+        group_of = combined
+        group_count = len(steps[-1][1]) if steps else 1
+        totals = [np.bincount(group_of, minlength=group_count)]
+        codes = [strings.codes[tag] for tag in NEGATIVE_TYPES if tag in strings.codes]
+        doc_types = column_array(store.doc_text['documentType'], 0, count)[ids]
+        sign = np.where(np.isin(doc_types, codes), -1.0, 1.0)
+        for key, _ in values:
+            amounts = column_array(store.doc_number[key], 0, count)[ids] * sign
+            totals.append(np.round(np.bincount(group_of, weights=amounts, minlength=group_count), 2) + 0.0)
+
+        rows = []
+        for g in range(group_count):
+            row = []
+            group = g
+            for names, seen in reversed(steps):
+                group, code = divmod(int(seen[group]), len(names))
+                row.append(names[code])
+            row.reverse()
+            row.append(int(totals[0][g]))
+            row.extend(float(total[g]) for total in totals[1:])
+            rows.append(row)
+        rows.sort(key=lambda row: row[:len(keys)])
+        return rows
+
+
+def totals_layout(keys, labels, values=TOTAL_VALUES):
+    # (etiquetas, tipos) de las filas de group_totals, para export_rows
+    names = [MONTH_LABEL if key == MONTH_KEY else labels.get(key, key) for key in keys]
+    return (names + ["Documentos"] + [label for _, label in values],
+            ["text"] * len(keys) + ["number"] * (len(values) + 1))
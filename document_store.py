@@ -0,0 +1,260 @@
+from array import array
+
+from dian_parser import HEADER_FIELDS, TOTAL_FIELDS, tax_totals_by_name
+
+# Columnas fijas de cabecera: texto (códigos del StringPool) y montos (float64)
+DOC_TEXT_FIELDS = ['documentType', 'tipoDocLabel'] + [key for key, _ in HEADER_FIELDS] + [
+    'fileName',
+    'emisorNit', 'emisorNombre', 'emisorRegimen', 'emisorCiudad', 'emisorDepto', 'emisorDireccion', 'emisorEmail',
+    'receptorNit', 'receptorNombre', 'receptorCiudad', 'receptorDepto', 'receptorDireccion', 'receptorEmail',
+    'metodoPago', 'canalPago', 'fechaLimitePago',
+]
+DOC_NUMBER_FIELDS = [key for key, _ in TOTAL_FIELDS] + ['totalImpuestos']
+
+LINE_TEXT_FIELDS = ['lineId', 'descripcion', 'unidadMedida', 'codigoEstandar', 'marca', 'modelo']
+LINE_NUMBER_FIELDS = ['cantidad', 'precioUnitario', 'lineaBase', 'lineaImpuestos']
+
+SECTOR_PREFIXES = ('Salud_', 'Transporte_')
+
+# Código de "campo ausente" en las columnas dinámicas (sectoriales, contenedor, etc.)
+MISSING = -1
+
+
+class StringPool:
+    # Cada valor distinto se guarda una sola vez; las columnas guardan su código entero
+    def __init__(self):
+        self.values = [""]
+        self.codes = {"": 0}
+
+    def intern(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def __getitem__(self, code):
+        return self.values[code] if code != MISSING else ""
+
+    def __len__(self):
+        return len(self.values)
+
+
+class DocumentStore:
+    # Documentos cargados en tablas columnares: cabeceras, líneas e impuestos.
+    # Las líneas y los impuestos de un documento quedan contiguos, así que además de la
+    # llave foránea (line_doc, doc_tax_doc, line_tax_line) se guardan sus offsets.
+    # doc_tax_pivot y line_tax_pivot guardan, por nombre de impuesto, el monto total y
+    # las tasas de cada fila; sus llaves son el registro de columnas de impuestos.
+    # Las tablas solo crecen: un documento reemplazado o borrado queda marcado en doc_live
+    def __init__(self):
+        self.strings = StringPool()
+        self.doc_count = 0
+        self.line_count = 0
+        self.doc_live = array('b')
+        self.removed = 0
+
+        self.doc_text = {key: array('i') for key in DOC_TEXT_FIELDS}
+        self.doc_number = {key: array('d') for key in DOC_NUMBER_FIELDS}
+        self.doc_extra = {}
+        self._fixed = set(DOC_TEXT_FIELDS) | set(DOC_NUMBER_FIELDS) | {'items', 'impuestosDesglose', 'impuestosPorNombre'}
+        self.doc_line_start = array('q', [0])
+        self.doc_tax_start = array('q', [0])
+
+        self.line_doc = array('i')
+        self.line_text = {key: array('i') for key in LINE_TEXT_FIELDS}
+        self.line_number = {key: array('d') for key in LINE_NUMBER_FIELDS}
+        self.line_tax_start = array('q', [0])
+
+        self.doc_tax_doc = array('i')
+        self.doc_tax_name = array('i')
+        self.doc_tax_rate = array('i')
+        self.doc_tax_amount = array('d')
+
+        self.line_tax_line = array('i')
+        self.line_tax_name = array('i')
+        self.line_tax_rate = array('i')
+        self.line_tax_amount = array('d')
+
+        self.doc_tax_pivot = {}
+        self.line_tax_pivot = {}
+
+    def __len__(self):
+        return self.doc_count
+
+    def append(self, doc):
+        intern = self.strings.intern
+        doc_id = self.doc_count
+
+        for key, column in self.doc_text.items():
+            column.append(intern(doc.get(key, "")))
+        for key, column in self.doc_number.items():
+            column.append(doc.get(key, 0))
+
+        # Campos fuera del esquema fijo: una columna por nombre, rellenada con MISSING
+        seen = set()
+        for key, value in doc.items():
+            if key in self._fixed:
+                continue
+            column = self.doc_extra.get(key)
+            if column is None:
+                column = self.doc_extra[key] = array('i', [MISSING]) * doc_id
+            column.append(intern(value))
+            seen.add(key)
+        for key, column in self.doc_extra.items():
+            if key not in seen:
+                column.append(MISSING)
+
+        for tax in doc.get('impuestosDesglose', {}).values():
+            self.doc_tax_doc.append(doc_id)
+            self.doc_tax_name.append(intern(tax['name']))
+            self.doc_tax_rate.append(intern(tax['rate']))
+            self.doc_tax_amount.append(tax['amount'])
+        self.doc_tax_start.append(len(self.doc_tax_amount))
+        by_name = doc.get('impuestosPorNombre')
+        if by_name is None:
+            by_name = tax_totals_by_name(doc.get('impuestosDesglose', {}))
+        _append_pivot(self.doc_tax_pivot, by_name, doc_id, intern)
+
+        for item in doc.get('items', []):
+            line_id = self.line_count
+            self.line_doc.append(doc_id)
+            for key, column in self.line_text.items():
+                column.append(intern(item.get(key, "")))
+            for key, column in self.line_number.items():
+                column.append(item.get(key, 0))
+            for tax in item.get('lineaImpuestosDetalle', {}).values():
+                self.line_tax_line.append(line_id)
+                self.line_tax_name.append(intern(tax['name']))
+                self.line_tax_rate.append(intern(tax['rate']))
+                self.line_tax_amount.append(tax['amount'])
+            self.line_tax_start.append(len(self.line_tax_amount))
+            by_name = item.get('lineaImpuestosPorNombre')
+            if by_name is None:
+                by_name = tax_totals_by_name(item.get('lineaImpuestosDetalle', {}))
+            _append_pivot(self.line_tax_pivot, by_name, line_id, intern)
+            self.line_count += 1
+        self.doc_line_start.append(self.line_count)
+        self.doc_live.append(1)
+
+        self.doc_count += 1
+        return doc_id
+
+    def extend(self, docs):
+        for doc in docs:
+            self.append(doc)
+
+    def remove(self, doc_id):
+        # Marca el documento como eliminado; sus filas siguen en las tablas pero las
+        # proyecciones y documents() lo omiten
+        if self.doc_live[doc_id]:
+            self.doc_live[doc_id] = 0
+            self.removed += 1
+
+    def is_live(self, doc_id):
+        return bool(self.doc_live[doc_id])
+
+    @property
+    def live_count(self):
+        return self.doc_count - self.removed
+
+    # Lectura
+
+    def value(self, doc_id, key):
+        column = self.doc_text.get(key)
+        if column is not None:
+            return self.strings[column[doc_id]]
+        column = self.doc_number.get(key)
+        if column is not None:
+            return column[doc_id]
+        column = self.doc_extra.get(key)
+        if column is not None:
+            return self.strings[column[doc_id]]
+        return ""
+
+    def is_line_field(self, key):
+        return key in self.line_text or key in self.line_number
+
+    def line_value(self, line_id, key):
+        column = self.line_text.get(key)
+        if column is not None:
+            return self.strings[column[line_id]]
+        column = self.line_number.get(key)
+        if column is not None:
+            return column[line_id]
+        return ""
+
+    # Lectura por columnas, para proyecciones: valores de las filas [start, stop)
+
+    def doc_column(self, key, start=0, stop=None):
+        stop = self.doc_count if stop is None else stop
+        column = self.doc_number.get(key)
+        if column is not None:
+            return column[start:stop].tolist()
+        column = self.doc_text.get(key)
+        if column is None:
+            column = self.doc_extra.get(key)
+        if column is None:
+            return [""] * (stop - start)
+        strings = self.strings
+        return [strings[code] for code in column[start:stop]]
+
+    def line_column(self, key, start=0, stop=None):
+        stop = self.line_count if stop is None else stop
+        column = self.line_number.get(key)
+        if column is not None:
+            return column[start:stop].tolist()
+        column = self.line_text.get(key)
+        if column is None:
+            return [""] * (stop - start)
+        strings = self.strings
+        return [strings[code] for code in column[start:stop]]
+
+    def doc_tax_column(self, name, rates=False, start=0, stop=None):
+        stop = self.doc_count if stop is None else stop
+        return _pivot_column(self.doc_tax_pivot, name, rates, start, stop, self.strings)
+
+    def line_tax_column(self, name, rates=False, start=0, stop=None):
+        stop = self.line_count if stop is None else stop
+        return _pivot_column(self.line_tax_pivot, name, rates, start, stop, self.strings)
+
+    def tax_names(self):
+        return self.doc_tax_pivot.keys() | self.line_tax_pivot.keys()
+
+    def extra_fields(self, prefixes):
+        return [key for key in self.doc_extra if key.startswith(prefixes)]
+
+    def sector_fields(self):
+        return self.extra_fields(SECTOR_PREFIXES)
+
+
+def _append_pivot(pivot, by_name, row, intern):
+    for name, entry in by_name.items():
+        column = pivot.get(name)
+        if column is None:
+            column = pivot[name] = (array('d', [0.0]) * row, array('i', [MISSING]) * row)
+        column[0].append(entry['amount'])
+        column[1].append(intern(", ".join(entry['rates'])))
+    for name, column in pivot.items():
+        if name not in by_name:
+            column[0].append(0.0)
+            column[1].append(MISSING)
+
+
+def _pivot_column(pivot, name, rates, start, stop, strings):
+    # Montos o tasas ("tasa1, tasa2") del impuesto por fila: 0 o "" donde no aplica
+    column = pivot.get(name)
+    if column is None:
+        return [("" if rates else 0)] * (stop - start)
+    amounts, codes = column
+    if rates:
+        return [strings[code] for code in codes[start:stop]]
+    return [amount if code != MISSING else 0 for amount, code in zip(amounts[start:stop], codes[start:stop])]
+
+
+def column_array(column, start=0, stop=None):
+    # column[start:stop] como arreglo de numpy del mismo tipo. El slice de array.array es una
+    # copia, así que el store puede seguir creciendo mientras se usa el resultado.
+    # numpy se importa al llamar, no al cargar el módulo (arranque del modo por lotes)
+    import numpy as np
+    return np.frombuffer(column[start:stop], dtype=column.typecode)
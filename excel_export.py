@@ -0,0 +1,80 @@
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
+
+# Límite de filas de una hoja de Excel (incluye el encabezado)
+EXCEL_MAX_ROWS = 1048576
+EXCEL_MAX_SHEET_TITLE = 31
+
+# Mismo estilo de encabezado que usa pandas en to_excel
+_THIN = Side(style="thin")
+HEADER_FONT = Font(bold=True)
+HEADER_BORDER = Border(left=_THIN, right=_THIN, top=_THIN, bottom=_THIN)
+HEADER_ALIGNMENT = Alignment(horizontal="center", vertical="top")
+
+
+def sheet_title(name):
+    title = str(name)[:EXCEL_MAX_SHEET_TITLE]
+    for char in '[]*:?/\\':
+        title = title.replace(char, '')
+    return title or "Hoja"
+
+
+class StreamingWorkbook:
+    # Libro en modo write-only de openpyxl: cada fila se escribe directo al archivo
+    # temporal de su hoja, sin DataFrame ni copias por tipo de documento. Al llegar al
+    # límite de filas de Excel la hoja continúa en una nueva ("Factura (2)", ...)
+    def __init__(self, path, labels, max_rows=EXCEL_MAX_ROWS):
+        self.path = path
+        self.labels = labels
+        self.max_rows = max_rows
+        self.workbook = Workbook(write_only=True)
+        self.sheets = {}
+        self.titles = set()
+
+    def _new_sheet(self, base, part):
+        suffix = f" ({part})" if part > 1 else ""
+        title = base[:EXCEL_MAX_SHEET_TITLE - len(suffix)] + suffix
+        n = 2
+        while title.lower() in self.titles:
+            extra = f"~{n}"
+            title = base[:EXCEL_MAX_SHEET_TITLE - len(suffix) - len(extra)] + extra + suffix
+            n += 1
+        self.titles.add(title.lower())
+
+        ws = self.workbook.create_sheet(title)
+        header = []
+        for label in self.labels:
+            cell = WriteOnlyCell(ws, value=label)
+            cell.font = HEADER_FONT
+            cell.border = HEADER_BORDER
+            cell.alignment = HEADER_ALIGNMENT
+            header.append(cell)
+        ws.append(header)
+        return ws
+
+    def append(self, row, sheet="Sheet1"):
+        entry = self.sheets.get(sheet)
+        if entry is None:
+            base = sheet_title(sheet)
+            entry = self.sheets[sheet] = [self._new_sheet(base, 1), 1, 1, base]
+        elif entry[1] >= self.max_rows:
+            entry[2] += 1
+            entry[0] = self._new_sheet(entry[3], entry[2])
+            entry[1] = 1
+        entry[0].append(row)
+        entry[1] += 1
+
+    def save(self, default_sheet="Sheet1"):
+        if not self.sheets:
+            self._new_sheet(sheet_title(default_sheet), 1)
+        self.workbook.save(self.path)
+
+
+def write_xlsx(path, labels, rows, group_by=None, sheet_name="Sheet1", max_rows=EXCEL_MAX_ROWS):
+    # Escribe las filas en una sola pasada; con group_by (índice de columna) cada fila va a
+    # la hoja de su valor, creada la primera vez que aparece
+    book = StreamingWorkbook(path, labels, max_rows)
+    for row in rows:
+        book.append(row, row[group_by] if group_by is not None else sheet_name)
+    book.save(sheet_name)
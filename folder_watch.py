@@ -0,0 +1,219 @@
+import ctypes
+import ctypes.util
+import os
+import re
+import select
+import struct
+import threading
+import time
+
+# Vigilancia de una carpeta: se acumulan las rutas que cambian y poll() las entrega cuando
+# llevan DEFAULT_DEBOUNCE segundos quietas, para no leer un archivo a medio copiar.
+# Usa inotify (Linux) y, si no está disponible o la carpeta está en un disco de red (inotify
+# no ve los cambios que hacen otros equipos en SMB/NFS), compara un inventario de la carpeta
+# cada POLL_INTERVAL segundos
+
+DEFAULT_DEBOUNCE = 1.0
+POLL_INTERVAL = 2.0
+
+WATCHED_EXTENSIONS = ('.xml', '.zip')
+
+# Tipos de sistema de archivos de red en /proc/mounts
+NETWORK_FILESYSTEMS = {'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', 'ncpfs', 'afs', '9p', 'ceph', 'glusterfs',
+                       'fuse.sshfs', 'fuse.glusterfs'}
+MOUNTS_FILE = '/proc/mounts'
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def is_watched_file(name):
+    return name.lower().endswith(WATCHED_EXTENSIONS)
+
+
+def snapshot(folder, recursive=True):
+    # {ruta: (tamaño, mtime_ns)} de los .xml y .zip de la carpeta
+    files = {}
+    pending = [folder]
+    while pending:
+        current = pending.pop()
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive:
+                            pending.append(entry.path)
+                    elif is_watched_file(entry.name):
+                        try:
+                            st = entry.stat()
+                        except OSError:
+                            continue
+                        files[entry.path] = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            continue
+    return files
+
+
+def _unescape_mount(path):
+    # /proc/mounts escribe espacios y otros caracteres como \ooo (octal)
+    return re.sub(r'\\([0-7]{3})', lambda m: chr(int(m.group(1), 8)), path)
+
+
+def is_network_folder(folder):
+    # True si la carpeta está en un montaje de red según /proc/mounts (solo Linux)
+    try:
+        with open(MOUNTS_FILE, encoding='utf-8', errors='replace') as f:
+            mounts = [line.split()[1:3] for line in f if len(line.split()) >= 3]
+    except OSError:
+        return False
+    folder = os.path.join(os.path.realpath(folder), "")
+    best, best_type = "", None
+    for mount_point, fs_type in mounts:
+        mount_point = os.path.join(_unescape_mount(mount_point), "")
+        if folder.startswith(mount_point) and len(mount_point) >= len(best):
+            best, best_type = mount_point, fs_type
+    return best_type in NETWORK_FILESYSTEMS
+
+
+class _Inotify:
+    # inotify por ctypes, con un watch por subcarpeta
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        self.dirs = {}
+
+    def add(self, folder, recursive=True):
+        pending = [folder]
+        while pending:
+            current = pending.pop()
+            wd = self._add_watch(self.fd, os.fsencode(current), WATCH_MASK)
+            if wd < 0:
+                continue
+            self.dirs[wd] = current
+            if recursive:
+                try:
+                    with os.scandir(current) as it:
+                        pending.extend(entry.path for entry in it if entry.is_dir(follow_symlinks=False))
+                except OSError:
+                    pass
+
+    def read(self, timeout):
+        # [(ruta, máscara)] de los eventos recibidos en timeout segundos
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        data = os.read(self.fd, 64 * 1024)
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if mask & IN_IGNORED:
+                self.dirs.pop(wd, None)
+                continue
+            folder = self.dirs.get(wd)
+            if folder is not None or mask & IN_Q_OVERFLOW:
+                events.append((os.path.join(folder, name) if folder and name else folder, mask))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    def __init__(self, folder, recursive=True, debounce=DEFAULT_DEBOUNCE, interval=POLL_INTERVAL, use_inotify=True):
+        self.folder = folder
+        self.recursive = recursive
+        self.debounce = debounce
+        self.interval = interval
+        self.backend = "polling"
+        self._inotify = None
+        if use_inotify and not is_network_folder(folder):
+            try:
+                self._inotify = _Inotify()
+                self.backend = "inotify"
+            except (OSError, AttributeError):
+                self._inotify = None
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._inotify is not None:
+            self._inotify.add(self.folder, self.recursive)
+            target = self._run_inotify
+        else:
+            target = self._run_polling
+        self._thread = threading.Thread(target=target, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def _touch(self, paths):
+        now = time.monotonic()
+        with self._lock:
+            for path in paths:
+                self._pending[path] = now
+
+    def poll(self):
+        # Rutas (archivos o carpetas) que cambiaron y ya no reciben escrituras
+        now = time.monotonic()
+        with self._lock:
+            ready = [path for path, last in self._pending.items() if now - last >= self.debounce]
+            for path in ready:
+                del self._pending[path]
+        return ready
+
+    def _run_polling(self):
+        known = snapshot(self.folder, self.recursive)
+        while not self._stop.wait(self.interval):
+            current = snapshot(self.folder, self.recursive)
+            changed = [path for path, state in current.items() if known.get(path) != state]
+            changed.extend(path for path in known if path not in current)
+            if changed:
+                self._touch(changed)
+            known = current
+
+    def _run_inotify(self):
+        inotify = self._inotify
+        while not self._stop.is_set():
+            changed = []
+            for path, mask in inotify.read(0.5):
+                if mask & IN_Q_OVERFLOW:
+                    # Se perdieron eventos: se revisa toda la carpeta
+                    changed.append(self.folder)
+                elif mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO) and self.recursive:
+                        # Los archivos copiados antes de registrar el watch llegan sin evento
+                        inotify.add(path, self.recursive)
+                        changed.append(path)
+                    elif mask & (IN_DELETE | IN_MOVED_FROM):
+                        changed.append(path)
+                elif path and is_watched_file(path):
+                    changed.append(path)
+            if changed:
+                self._touch(changed)
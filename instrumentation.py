@@ -0,0 +1,91 @@
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# Medición opcional de tiempos por etapa y por archivo. Quien no recibe un Profiler (None)
+# no mide nada: las rutas calientes solo preguntan `if profiler is not None`.
+# El CPU de una etapa es el del hilo que la ejecuta (time.thread_time); en cada archivo, el
+# del hilo que lo leyó (read) y el del que lo parseó (parse, extract)
+
+# Etapas de lectura de un archivo, en el orden en que ocurren
+FILE_STAGES = ('read', 'parse', 'extract')
+
+
+class Profiler:
+    def __init__(self):
+        self.stages = {}
+        self.files = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - wall, time.thread_time() - cpu)
+
+    def add_stage(self, name, wall, cpu, count=1):
+        with self._lock:
+            entry = self.stages.setdefault(name, [0.0, 0.0, 0])
+            entry[0] += wall
+            entry[1] += cpu
+            entry[2] += count
+
+    def add_file(self, path, timings, error=None):
+        # timings: {'size': bytes, etapa: (wall, cpu)} tal como lo devuelve dian_parser
+        with self._lock:
+            self.files.append((str(path), timings, error))
+            for name in FILE_STAGES:
+                if name in timings:
+                    entry = self.stages.setdefault(f"file.{name}", [0.0, 0.0, 0])
+                    entry[0] += timings[name][0]
+                    entry[1] += timings[name][1]
+                    entry[2] += 1
+
+    def file_seconds(self, timings):
+        return sum(timings[name][0] for name in FILE_STAGES if name in timings)
+
+    def slowest(self, top=10):
+        return sorted(self.files, key=lambda f: self.file_seconds(f[1]), reverse=True)[:top]
+
+    def failed(self):
+        return [f for f in self.files if f[2]]
+
+    def summary(self, top=10):
+        lines = ["Etapa                 seg      cpu   veces"]
+        for name, (wall, cpu, count) in self.stages.items():
+            lines.append(f"{name:<18}{wall:>8.2f}{cpu:>9.2f}{count:>8}")
+
+        if self.files:
+            total_bytes = sum(f[1].get('size', 0) for f in self.files)
+            lines.append(f"\n{len(self.files)} archivos leídos, {total_bytes / (1024 * 1024):.1f} MB")
+            lines.append("Más lentos:")
+            for path, timings, _ in self.slowest(top):
+                detail = " ".join(f"{name} {timings[name][0] * 1000:.0f}ms" for name in FILE_STAGES if name in timings)
+                lines.append(f"  {self.file_seconds(timings) * 1000:>7.0f} ms  {timings.get('size', 0) / 1024:>7.0f} KB  "
+                             f"{path} ({detail})")
+        failed = self.failed()
+        if failed:
+            lines.append(f"Con error ({len(failed)}):")
+            for path, _, error in failed[:top]:
+                lines.append(f"  {path}: {error}")
+            if len(failed) > top:
+                lines.append(f"  ... y {len(failed) - top} más")
+        return "\n".join(lines)
+
+    def to_dict(self):
+        return {
+            'stages': {name: {'seconds': wall, 'cpu_seconds': cpu, 'count': count}
+                       for name, (wall, cpu, count) in self.stages.items()},
+            'files': [{'path': path, 'size': timings.get('size', 0), 'error': error,
+                       **{name: {'seconds': timings[name][0], 'cpu_seconds': timings[name][1]}
+                          for name in FILE_STAGES if name in timings}}
+                      for path, timings, error in self.files],
+        }
+
+
+def timed(profiler, name):
+    # profiler.stage(name), o un contexto vacío si no se está midiendo
+    return profiler.stage(name) if profiler is not None else nullcontext()
@@ -0,0 +1,154 @@
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from dian_parser import PARSER_VERSION, ZipMember, read_source, source_path
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def default_cache_path():
+    base = os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'SuperFacturas', 'parse_cache.sqlite')
+
+
+def file_digest(source):
+    h = hashlib.blake2b(digest_size=20)
+    if isinstance(source, ZipMember):
+        h.update(read_source(source))
+        return h.hexdigest()
+    with open(source, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def open_cache(warn):
+    # ParseCache por defecto, o None si no se puede abrir: la carga sigue sin caché y
+    # warn(mensaje) informa el motivo
+    try:
+        return ParseCache()
+    except (sqlite3.Error, OSError) as e:
+        warn(f"Caché no disponible ({default_cache_path()}): {type(e).__name__}: {e}")
+        return None
+
+
+def cache_key(source):
+    # Un miembro de .zip se identifica por la ruta del .zip y su nombre interno
+    if isinstance(source, ZipMember):
+        return f"{os.path.abspath(source.archive)}!{source.name}"
+    return os.path.abspath(source)
+
+
+class ParseCache:
+    # Resultados de parse_dian_xml persistidos en SQLite, indexados por ruta, tamaño y mtime
+    # (los de un .zip, por el tamaño y mtime del .zip).
+    # Con verify_hash=True además se compara el contenido (blake2b) antes de dar un acierto.
+    def __init__(self, db_path=None, max_bytes=DEFAULT_MAX_BYTES, verify_hash=False):
+        self.db_path = db_path or default_cache_path()
+        self.max_bytes = max_bytes
+        self.verify_hash = verify_hash
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        try:
+            self._open()
+        except sqlite3.OperationalError:
+            raise  # bloqueada o sin permisos: no se toca el archivo
+        except sqlite3.DatabaseError:
+            # Archivo dañado o que no es SQLite: es solo una caché, se descarta y se crea de nuevo
+            self.conn.close()
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(self.db_path + suffix):
+                    os.remove(self.db_path + suffix)
+            self._open()
+
+    def _open(self):
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS documents (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                digest TEXT,
+                parser_version INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                nbytes INTEGER NOT NULL,
+                payload BLOB NOT NULL
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_last_used ON documents(last_used)")
+        self.conn.commit()
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM documents").fetchone()[0]
+
+    def get(self, file_path, st=None):
+        payload = self.get_payload(file_path, st)
+        return self.decode(payload) if payload is not None else None
+
+    def get_payload(self, file_path, st=None):
+        # Como get, pero sin decodificar: el documento serializado (ver decode) o None
+        st = st or os.stat(source_path(file_path))
+        key = cache_key(file_path)
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT size, mtime_ns, digest, parser_version, payload FROM documents WHERE path = ?",
+                (key,)).fetchone()
+            if row is None or row[0] != st.st_size or row[3] != PARSER_VERSION or \
+                    (row[1] != st.st_mtime_ns and not self.verify_hash):
+                self.misses += 1
+                return None
+            if self.verify_hash and row[2] != file_digest(file_path):
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE documents SET last_used = ?, mtime_ns = ? WHERE path = ?",
+                              (time.time(), st.st_mtime_ns, key))
+            self.hits += 1
+        return row[4]
+
+    def decode(self, payload):
+        return pickle.loads(payload)
+
+    def put(self, file_path, doc, st=None):
+        st = st or os.stat(source_path(file_path))
+        key = cache_key(file_path)
+        payload = pickle.dumps(doc, protocol=pickle.HIGHEST_PROTOCOL)
+        digest = file_digest(file_path) if self.verify_hash else None
+        with self._lock:
+            old = self.conn.execute("SELECT nbytes FROM documents WHERE path = ?", (key,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, st.st_size, st.st_mtime_ns, digest, PARSER_VERSION, time.time(), len(payload), payload))
+            self.total_bytes += len(payload) - (old[0] if old else 0)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # LRU: se liberan las entradas menos usadas hasta quedar en el 90% del límite
+        target = self.max_bytes * 0.9
+        freed = []
+        for path, nbytes in self.conn.execute("SELECT path, nbytes FROM documents ORDER BY last_used"):
+            if self.total_bytes <= target:
+                break
+            freed.append((path,))
+            self.total_bytes -= nbytes
+        self.conn.executemany("DELETE FROM documents WHERE path = ?", freed)
+
+    def flush(self):
+        with self._lock:
+            self.conn.commit()
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
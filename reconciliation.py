@@ -0,0 +1,93 @@
+# Conciliación de totales sobre las columnas del DocumentStore, con operaciones de numpy
+# agrupadas por documento (sin recorrer diccionarios):
+#   difBruto       totalBruto (LineExtensionAmount) - suma de lineaBase
+#   difImpuestos   totalImpuestos - suma de lineaImpuestos
+#   difTotalIvaInc totalIvaInc - (totalBruto + totalImpuestos)
+#   difPagar       totalPagar - (totalIvaInc - totalDescuentos + totalCargos - totalAnticipos)
+# Un documento sin líneas no se compara contra ellas (diferencia 0). En nómina las líneas
+# son devengados (+) y deducciones (-): se comparan con totalBruto - totalDescuentos.
+# numpy se importa al conciliar, no al cargar el módulo (arranque del modo por lotes)
+
+from dian_parser import NOMINA_ROOTS
+from document_store import column_array
+
+DEFAULT_TOLERANCE = 1.0
+
+CHECKS = [
+    ('difBruto', "bruto"),
+    ('difImpuestos', "impuestos"),
+    ('difTotalIvaInc', "total con impuestos"),
+    ('difPagar', "total a pagar"),
+]
+DIFF_KEYS = [key for key, _ in CHECKS]
+STATUS_KEY = 'conciliacion'
+RECONCILIATION_KEYS = set(DIFF_KEYS) | {STATUS_KEY}
+
+# Texto de estado para cada combinación de descuadres (bit i = CHECKS[i])
+STATUS_LABELS = ["OK"] + [
+    "Descuadre: " + ", ".join(name for i, (_, name) in enumerate(CHECKS) if code & (1 << i))
+    for code in range(1, 1 << len(CHECKS))
+]
+
+
+def reconcile(store, start=0, stop=None, tolerance=DEFAULT_TOLERANCE):
+    # {clave: arreglo por documento} para los documentos [start, stop): las diferencias,
+    # 'codes' (bits de los controles fuera de tolerancia) y 'conciliacion' (texto)
+    import numpy as np
+
+    stop = len(store) if stop is None else stop
+    count = stop - start
+    line_start = column_array(store.doc_line_start, start, stop + 1)
+    lo, hi = int(line_start[0]), int(line_start[-1])
+    line_counts = np.diff(line_start)
+    doc_of_line = np.repeat(np.arange(count), line_counts)
+
+    def doc_values(key):
+        return column_array(store.doc_number[key], start, stop)
+
+    def line_sum(key):
+        values = column_array(store.line_number[key], lo, hi)
+        return np.bincount(doc_of_line, weights=values, minlength=count)
+
+    bruto = doc_values('totalBruto')
+    impuestos = doc_values('totalImpuestos')
+    iva_inc = doc_values('totalIvaInc')
+    descuentos = doc_values('totalDescuentos')
+    has_lines = line_counts > 0
+
+    codes = [store.strings.codes[tag] for tag in NOMINA_ROOTS if tag in store.strings.codes]
+    if codes:
+        doc_type = column_array(store.doc_text['documentType'], start, stop)
+        lines_total = np.where(np.isin(doc_type, codes), bruto - descuentos, bruto)
+    else:
+        lines_total = bruto
+
+    result = {
+        'difBruto': np.where(has_lines, lines_total - line_sum('lineaBase'), 0.0),
+        'difImpuestos': np.where(has_lines, impuestos - line_sum('lineaImpuestos'), 0.0),
+        'difTotalIvaInc': iva_inc - (bruto + impuestos),
+        'difPagar': doc_values('totalPagar') - (
+            iva_inc - descuentos
+            + doc_values('totalCargos')
+            - doc_values('totalAnticipos')),
+    }
+    codes = np.zeros(count, dtype=np.int64)
+    for bit, key in enumerate(DIFF_KEYS):
+        result[key] = np.round(result[key], 2) + 0.0  # sin -0.0
+        codes |= (np.abs(result[key]) > tolerance).astype(np.int64) << bit
+    result['codes'] = codes
+    result[STATUS_KEY] = np.array(STATUS_LABELS, dtype=object)[codes]
+    return result
+
+
+def mismatches(store, doc_ids=None, tolerance=DEFAULT_TOLERANCE):
+    # doc_ids vigentes (entre los dados, si se dan) con algún control fuera de tolerancia
+    import numpy as np
+
+    codes = reconcile(store, tolerance=tolerance)['codes']
+    wanted = column_array(store.doc_live).astype(bool)
+    if doc_ids is not None:
+        selected = np.zeros(len(store), dtype=bool)
+        selected[np.asarray(doc_ids, dtype=np.intp)] = True
+        wanted &= selected
+    return np.flatnonzero((codes != 0) & wanted).tolist()
@@ -0,0 +1,251 @@
+from bisect import bisect_left
+
+from reconciliation import DIFF_KEYS, RECONCILIATION_KEYS, reconcile
+
+# Columnas disponibles: (clave, etiqueta, visible por defecto)
+COLUMNS_CONFIG = [
+    # Info Básica
+    ("tipoDocLabel", "Tipo Doc", True),
+    ("numero", "Número", True),
+    ("fechaEmision", "Fecha", True),
+    ("horaEmision", "Hora", False),
+    ("fechaVencimiento", "Vencimiento", False),
+    ("moneda", "Moneda", False),
+    # Emisor
+    ("emisorNombre", "Emisor Nombre", True),
+    ("emisorNit", "Emisor NIT", True),
+    ("emisorCiudad", "Emisor Ciudad", False),
+    ("emisorEmail", "Emisor Email", False),
+    # Receptor
+    ("receptorNombre", "Receptor Nombre", True),
+    ("receptorNit", "Receptor NIT", True),
+    ("receptorCiudad", "Receptor Ciudad", False),
+    ("receptorEmail", "Receptor Email", False),
+    # Pagos
+    ("metodoPago", "Método Pago", False),
+    ("canalPago", "Canal Pago", False),
+    ("fechaLimitePago", "Límite Pago", False),
+    # Nómina
+    ("periodoInicio", "Periodo Desde", False),
+    ("periodoFin", "Periodo Hasta", False),
+    # Totales
+    ("totalBruto", "Subtotal Bruto", True),
+    ("baseImponible", "Base Impuestos", True),
+    ("totalDescuentos", "Descuentos", False),
+    ("totalImpuestos", "Total Impuestos", True),
+    ("totalPagar", "Total a Pagar", True),
+    # Ítems (en modo detalle)
+    ("lineId", "Ítem #", True),
+    ("descripcion", "Descripción", True),
+    ("cantidad", "Cant", True),
+    ("unidadMedida", "UM", False),
+    ("precioUnitario", "Precio Unit", True),
+    ("lineaBase", "Línea Base", True),
+    ("lineaImpuestos", "Línea Imp", True),
+    ("marca", "Marca", False),
+    ("modelo", "Modelo", False),
+    ("codigoEstandar", "Cód Estándar", False),
+    # Otros
+    ("cufe", "CUFE", False),
+    ("validacionDian", "Validación DIAN", False),
+    ("contenedorNumero", "Contenedor", False),
+    ("fileName", "Archivo", False),
+    # Conciliación de totales (reconciliation)
+    ("conciliacion", "Conciliación", False),
+    ("difBruto", "Dif. Bruto vs Líneas", False),
+    ("difImpuestos", "Dif. Impuestos vs Líneas", False),
+    ("difTotalIvaInc", "Dif. Total con Impuestos", False),
+    ("difPagar", "Dif. Total a Pagar", False),
+]
+
+ITEM_KEYS = ['lineId', 'descripcion', 'cantidad', 'unidadMedida', 'precioUnitario', 'lineaBase', 'lineaImpuestos', 'marca', 'modelo', 'codigoEstandar']
+
+TAX_VALUE_PREFIX = "tax_val_"
+TAX_RATE_PREFIX = "tax_rate_"
+
+# Columnas de fecha (AAAA-MM-DD) para los formatos con tipos
+DATE_KEYS = {'fechaEmision', 'fechaVencimiento', 'fechaLimitePago', 'contenedorFecha', 'fechaValidacionDian',
+             'periodoInicio', 'periodoFin'}
+
+# Filas del store que stream_rows calcula de una vez
+STREAM_CHUNK_ROWS = 10000
+
+
+class RowProjection:
+    # Filas aplanadas del DocumentStore que comparten la vista previa y la exportación.
+    # Se materializan por columna y se guardan por (modo, columna): activar una columna
+    # solo calcula esa columna, y si el store crece solo se agregan las filas nuevas.
+    # Las columnas se indexan por fila del store; si hay documentos eliminados o una
+    # selección (doc_ids de DocumentQuery.select), row_count y rows() recorren solo esas filas
+    def __init__(self, store):
+        self.store = store
+        self._columns = {}
+        self._live = {}
+        self._reconciled = None
+        self.selection = None
+
+    def select(self, doc_ids):
+        # Limita las filas a estos documentos (None: todos); las columnas en caché se conservan
+        if doc_ids != self.selection:
+            self.selection = doc_ids
+            self._live = {}
+
+    def layout(self, detail, visible):
+        # visible: [(clave, etiqueta)] en el orden configurado. Devuelve las columnas finales
+        # con el desglose de impuestos por nombre y los campos sectoriales ya inyectados
+        store = self.store
+        tax_names = sorted(store.tax_names())
+        extra_list = sorted(store.sector_fields())
+        is_summary = detail == "summary"
+
+        final_cols = []
+        final_labels = []
+        for key, label in visible:
+            if is_summary and key in ITEM_KEYS:
+                continue
+            final_cols.append(key)
+            final_labels.append(label)
+
+            # Inyectar desglose de impuestos agrupados por Nombre
+            if key == 'totalImpuestos' or key == 'lineaImpuestos':
+                for t_name in tax_names:
+                    col_val = f"{TAX_VALUE_PREFIX}{t_name}"
+                    if col_val not in final_cols:
+                        final_cols.append(col_val)
+                        final_labels.append(f"{t_name} (Valor)")
+                        final_cols.append(f"{TAX_RATE_PREFIX}{t_name}")
+                        final_labels.append(f"{t_name} %")
+
+        # Inyectar campos sectoriales al final si existen
+        for extra in extra_list:
+            final_cols.append(extra)
+            final_labels.append(extra.replace('_', ' '))
+        return final_cols, final_labels
+
+    def column_kind(self, col):
+        # "number", "date" o "text"
+        store = self.store
+        if col.startswith(TAX_VALUE_PREFIX) or col in store.doc_number or col in store.line_number or col in DIFF_KEYS:
+            return "number"
+        if col in DATE_KEYS:
+            return "date"
+        return "text"
+
+    def _stored_rows(self, detail):
+        # En modo ítems solo cuentan las líneas de documentos ya completos en el store
+        store = self.store
+        return len(store) if detail == "summary" else store.doc_line_start[len(store)]
+
+    def live_rows(self, detail):
+        # Filas del store vigentes y seleccionadas, o None si son todas
+        store = self.store
+        selection = self.selection
+        if not store.removed and selection is None:
+            return None
+        stamp = (len(store), store.removed)
+        cached = self._live.get(detail)
+        if cached is None or cached[0] != stamp:
+            live = store.doc_live
+            if selection is not None:
+                docs = [doc_id for doc_id in selection if doc_id < stamp[0] and live[doc_id]]
+                if detail == "summary":
+                    rows = docs
+                else:
+                    line_start = store.doc_line_start
+                    rows = [line_id for doc_id in docs for line_id in range(line_start[doc_id], line_start[doc_id + 1])]
+            elif detail == "summary":
+                rows = [doc_id for doc_id in range(stamp[0]) if live[doc_id]]
+            else:
+                line_doc = store.line_doc
+                rows = [line_id for line_id in range(self._stored_rows(detail)) if live[line_doc[line_id]]]
+            cached = self._live[detail] = (stamp, rows)
+        return cached[1]
+
+    def row_count(self, detail):
+        live = self.live_rows(detail)
+        return self._stored_rows(detail) if live is None else len(live)
+
+    def column(self, detail, col):
+        total = self._stored_rows(detail)
+        values = self._columns.get((detail, col))
+        if values is None:
+            values = self._columns[(detail, col)] = []
+        if len(values) < total:
+            values.extend(self._compute(detail, col, len(values), total))
+        return values
+
+    def _compute(self, detail, col, start, stop):
+        store = self.store
+        if detail == "summary":
+            if col.startswith(TAX_VALUE_PREFIX):
+                # Monto total y tasas ya consolidados por nombre de impuesto
+                return store.doc_tax_column(col[len(TAX_VALUE_PREFIX):], False, start, stop)
+            if col.startswith(TAX_RATE_PREFIX):
+                return store.doc_tax_column(col[len(TAX_RATE_PREFIX):], True, start, stop)
+            if col in RECONCILIATION_KEYS:
+                return self._reconcile(start, stop)[col].tolist()
+            return store.doc_column(col, start, stop)
+
+        if col.startswith(TAX_VALUE_PREFIX):
+            # Valor en la línea
+            return store.line_tax_column(col[len(TAX_VALUE_PREFIX):], False, start, stop)
+        if col.startswith(TAX_RATE_PREFIX):
+            return store.line_tax_column(col[len(TAX_RATE_PREFIX):], True, start, stop)
+        if store.is_line_field(col):
+            return store.line_column(col, start, stop)
+        # Campo de cabecera repetido en cada línea de su documento
+        doc_values = self.column("summary", col)
+        return [doc_values[doc_id] for doc_id in store.line_doc[start:stop]]
+
+    def _reconcile(self, start, stop):
+        # Una conciliación da todas sus columnas: se guarda la del último rango pedido.
+        # Es por documento, así que solo hace falta para los documentos nuevos
+        if self._reconciled is None or self._reconciled[0] != (start, stop):
+            self._reconciled = ((start, stop), reconcile(self.store, start, stop))
+        return self._reconciled[1]
+
+    def rows(self, detail, cols, start=0, stop=None):
+        columns = [self.column(detail, col) for col in cols]
+        stop = self.row_count(detail) if stop is None else stop
+        live = self.live_rows(detail)
+        indexes = range(start, stop) if live is None else live[start:stop]
+        for index in indexes:
+            yield [values[index] for values in columns]
+
+    def stream_rows(self, detail, cols, chunk_rows=STREAM_CHUNK_ROWS):
+        # Las mismas filas que rows(), pero las columnas que no están en caché se calculan por
+        # bloques y no se guardan: exportar no deja una copia de cada columna en memoria
+        total = self._stored_rows(detail)
+        live = self.live_rows(detail)
+        position = 0
+        for start in range(0, total, chunk_rows):
+            stop = min(start + chunk_rows, total)
+            if live is None:
+                indexes = None
+            else:
+                end = bisect_left(live, stop, position)
+                indexes = live[position:end]
+                position = end
+                if not indexes:
+                    continue
+            columns = [self._chunk(detail, col, start, stop) for col in cols]
+            if indexes is None and columns:
+                yield from map(list, zip(*columns))
+                continue
+            for index in range(start, stop) if indexes is None else indexes:
+                yield [values[index - start] for values in columns]
+
+    def _chunk(self, detail, col, start, stop):
+        values = self._columns.get((detail, col))
+        if values is not None and len(values) >= stop:
+            return values[start:stop]
+        if detail != "summary" and not col.startswith((TAX_VALUE_PREFIX, TAX_RATE_PREFIX)) \
+                and not self.store.is_line_field(col):
+            # Campo de cabecera: solo los documentos de estas líneas (son contiguos)
+            line_doc = self.store.line_doc[start:stop]
+            if not line_doc:
+                return []
+            first = line_doc[0]
+            doc_values = self._chunk("summary", col, first, line_doc[-1] + 1)
+            return [doc_values[doc_id - first] for doc_id in line_doc]
+        return self._compute(detail, col, start, stop)
@@ -0,0 +1,137 @@
+import csv
+import os
+from datetime import date
+from itertools import islice
+
+from excel_export import sheet_title, write_xlsx
+from row_projection import COLUMNS_CONFIG
+
+# Filas por bloque al escribir CSV y Parquet
+CHUNK_ROWS = 50000
+
+EXPORT_FILETYPES = [
+    ("Excel files", "*.xlsx"),
+    ("CSV (Siigo, Helisa)", "*.csv"),
+    ("Parquet", "*.parquet"),
+]
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _open_csv(path, labels, delimiter, encoding):
+    f = open(path, 'w', newline='', encoding=encoding)
+    writer = csv.writer(f, delimiter=delimiter)
+    writer.writerow(labels)
+    return f, writer
+
+
+def write_csv(path, labels, rows, group_by=None, delimiter=",", encoding="utf-8-sig", chunk_rows=CHUNK_ROWS):
+    # utf-8-sig para que Excel y los importadores contables respeten las tildes.
+    # Con group_by se escribe un archivo por valor: "<nombre>_<valor>.csv"
+    root, ext = os.path.splitext(path)
+    files = {}
+    try:
+        if group_by is None:
+            files[None] = _open_csv(path, labels, delimiter, encoding)
+        for chunk in _chunks(rows, chunk_rows):
+            if group_by is None:
+                files[None][1].writerows(chunk)
+                continue
+            for row in chunk:
+                entry = files.get(row[group_by])
+                if entry is None:
+                    group_path = f"{root}_{sheet_title(row[group_by])}{ext or '.csv'}"
+                    entry = files[row[group_by]] = _open_csv(group_path, labels, delimiter, encoding)
+                entry[1].writerow(row)
+        if not files:
+            files[None] = _open_csv(path, labels, delimiter, encoding)
+    finally:
+        for f, _ in files.values():
+            f.close()
+
+
+def _to_number(value):
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_date(value):
+    try:
+        return date.fromisoformat(value[:10])
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_text(value):
+    return None if value is None else str(value)
+
+
+_CONVERTERS = {"number": _to_number, "date": _to_date, "text": _to_text}
+
+
+def write_parquet(path, labels, kinds, rows, chunk_rows=CHUNK_ROWS):
+    # Columnas tipadas: montos en float64 y fechas en date32, para consultar sin volver al XML.
+    # Cada bloque de filas se escribe como un row group
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Se necesita pyarrow para exportar a Parquet (pip install pyarrow)") from e
+
+    types = {"number": pa.float64(), "date": pa.date32(), "text": pa.string()}
+    schema = pa.schema([pa.field(label, types[kind]) for label, kind in zip(labels, kinds)])
+    converters = [_CONVERTERS[kind] for kind in kinds]
+
+    writer = pq.ParquetWriter(path, schema)
+    try:
+        for chunk in _chunks(rows, chunk_rows):
+            arrays = [pa.array([convert(value) for value in values], type=field.type)
+                      for convert, values, field in zip(converters, zip(*chunk), schema)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+    finally:
+        writer.close()
+
+
+def export_rows(path, labels, kinds, rows, group_by=None, sheet_name="Sheet1"):
+    # El formato sale de la extensión; .xlsx por defecto
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        write_csv(path, labels, rows, group_by)
+    elif ext == ".parquet":
+        write_parquet(path, labels, kinds, rows)
+    else:
+        write_xlsx(path, labels, rows, group_by, sheet_name)
+
+
+def export_projection(projection, path, detail, visible, group=False):
+    # Mismas columnas y valores que la vista previa. Las filas se calculan por bloques
+    # (stream_rows) y se escriben a medida que se generan; con group cada una va a la pestaña de
+    # su tipo (en CSV, a un archivo por tipo). Devuelve el número de filas exportadas
+    final_cols, final_labels = projection.layout(detail, visible)
+    cols, labels = [], []
+    for col, label in zip(final_cols, final_labels):
+        if label not in labels:
+            cols.append(col)
+            labels.append(label)
+
+    rows = projection.stream_rows(detail, cols)
+    kinds = [projection.column_kind(col) for col in cols]
+    if group:
+        column_labels = {key: label for key, label, _ in COLUMNS_CONFIG}
+        tipo_doc_label = column_labels.get('tipoDocLabel', 'Tipo Doc')
+        group_by = labels.index(tipo_doc_label) if tipo_doc_label in labels else None
+        export_rows(path, labels, kinds, rows, group_by, sheet_name="Resultados")
+    else:
+        export_rows(path, labels, kinds, rows)
+    return projection.row_count(detail)